@@ -3,17 +3,27 @@ Flask Web Application for AI Meal Planner
 Provides a web interface for generating personalized meal plans.
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
+from concurrent.futures import ProcessPoolExecutor
+import functools
 import sys
 import os
 
+# orjson serializes at C speed and handles NumPy scalars natively; fall
+# back to flask.jsonify when it's not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Add src directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from data_loader import load_recipes, User
+from data_loader import load_recipes, load_users, get_recipe_soa, User
+from constraints import filter_by_diet_and_allergens
 from csp_planner import greedy_csp_planner
 from baseline import random_baseline_planner
-from oracle import oracle_planner
+from beam_oracle import beam_oracle
 from metrics import evaluate_plan
 import time
 
@@ -24,6 +34,122 @@ print("Loading recipe database...")
 recipes = load_recipes('data/recipes.csv')
 print(f"Loaded {len(recipes)} recipes")
 
+# Structure-of-Arrays view for vectorized totals/scoring — the one
+# load_recipes already built and installed, not a second copy
+recipe_soa = get_recipe_soa()
+app.config['RECIPE_SOA'] = recipe_soa
+
+# Sample users are a small immutable file; parse them once at startup
+_SAMPLE_USERS = load_users('data/test_users.json')
+
+# Pay the one-time Numba compilation cost before the first request
+import _csp_kernel
+_csp_kernel.warmup()
+
+# Recipe lookup for mapping worker results back to loaded Recipe objects
+_RECIPES_BY_ID = {recipe.id: recipe for recipe in recipes}
+
+# Hard cap on a single planning request (seconds)
+PLANNER_TIMEOUT_S = 5
+
+
+def _warm_worker():
+    """
+    Executor-worker initializer.
+
+    Workers inherit the loaded recipe database with the module state; this
+    just pre-compiles the Numba kernel so the worker's first request
+    doesn't pay JIT cost.
+    """
+    _csp_kernel.warmup()
+
+
+def _plan_in_worker(algorithm, user_spec):
+    """
+    Run one planning request inside an executor worker.
+
+    Takes a plain dict instead of a User object and returns recipe ids
+    instead of Recipe objects to keep pickling traffic minimal.
+    """
+    user = User(
+        user_id=999,
+        name=user_spec['name'],
+        diet_type=user_spec['diet_type'],
+        calorie_target=user_spec['calorie_target'],
+        protein_min=user_spec['protein_min'],
+        allergens=user_spec['allergens'],
+        preferences=user_spec['preferences']
+    )
+
+    pool = list(get_filtered_pool(user.diet_type, frozenset(user.allergens)))
+
+    if algorithm == 'baseline':
+        plan = random_baseline_planner(pool, user, seed=42)
+    elif algorithm == 'oracle':
+        plan = beam_oracle(pool, user)
+    else:  # csp (default)
+        plan = greedy_csp_planner(pool, user, top_k=15)
+
+    return [recipe.id for recipe in plan] if plan else None
+
+
+# Warm planner pool shared across requests: planning is CPU-bound, so a
+# slow request occupies one worker process instead of blocking the server
+EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_warm_worker)
+
+
+def ojsonify(payload):
+    """Build a JSON response with orjson when available (jsonify otherwise)."""
+    if orjson is None:
+        return jsonify(payload)
+    return Response(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+                    mimetype='application/json')
+
+
+def _normalize_token(token):
+    """Trim and lowercase one user-supplied allergen/preference token."""
+    return token.strip().lower()
+
+
+def _normalize_tokens(tokens):
+    """
+    Normalize a list of user-supplied tokens, dropping empties.
+
+    map/filter keep the per-token work in the C layer instead of a list
+    comprehension that calls .strip() twice per token.
+    """
+    return list(filter(None, map(_normalize_token, tokens)))
+
+
+@functools.lru_cache(maxsize=128)
+def get_filtered_pool(diet_type, allergens):
+    """
+    Cache the diet/allergen-filtered recipe pool per constraint signature.
+
+    Different users with the same (diet_type, allergens) combination share
+    the same filtered pool, so repeat requests skip the full recipe scan.
+    Cache is only valid for the recipes loaded at startup; clear it with
+    get_filtered_pool.cache_clear() if recipes are ever reloaded.
+
+    Args:
+        diet_type: Diet type string (lowercase)
+        allergens: frozenset of allergen strings (lowercase)
+
+    Returns:
+        Tuple of Recipe objects passing diet and allergen constraints
+    """
+    # Minimal user carrying only the attributes the filter reads
+    filter_user = User(
+        user_id=-1,
+        name='_filter',
+        diet_type=diet_type,
+        calorie_target=0,
+        protein_min=0,
+        allergens=allergens,
+        preferences=[]
+    )
+    return tuple(filter_by_diet_and_allergens(recipes, filter_user))
+
 
 @app.route('/')
 def index():
@@ -57,29 +183,37 @@ def generate_plan():
             diet_type=data.get('diet_type', 'balanced'),
             calorie_target=float(data.get('calorie_target', 1700)),
             protein_min=float(data.get('protein_min', 70)),
-            allergens=[a.strip().lower() for a in data.get('allergens', []) if a.strip()],
-            preferences=[p.strip().lower() for p in data.get('preferences', []) if p.strip()]
+            allergens=_normalize_tokens(data.get('allergens', [])),
+            preferences=_normalize_tokens(data.get('preferences', []))
         )
 
         # Select algorithm
         algorithm = data.get('algorithm', 'csp')
 
-        # Generate plan
-        start_time = time.time()
+        # Generate plan in a warm worker process so CPU-bound planning
+        # doesn't block the serving process
+        start_ns = time.perf_counter_ns()
 
-        if algorithm == 'baseline':
-            plan = random_baseline_planner(recipes, user, seed=42)
-        elif algorithm == 'oracle':
-            plan = oracle_planner(recipes, user, max_combinations=10000)
-        else:  # csp (default)
-            plan = greedy_csp_planner(recipes, user, top_k=15)
+        future = EXECUTOR.submit(_plan_in_worker, algorithm, {
+            'name': user.name,
+            'diet_type': user.diet_type,
+            'calorie_target': user.calorie_target,
+            'protein_min': user.protein_min,
+            'allergens': list(user.allergens),
+            'preferences': list(user.preferences)
+        })
+        plan_ids = future.result(timeout=PLANNER_TIMEOUT_S)
+        plan = [_RECIPES_BY_ID[recipe_id] for recipe_id in plan_ids] if plan_ids else None
 
-        runtime_ms = (time.time() - start_time) * 1000
+        runtime_ms = (time.perf_counter_ns() - start_ns) / 1e6
 
         # Evaluate plan
         if plan:
             metrics = evaluate_plan(plan, user)
 
+            # SoA row indices for the selected recipes
+            plan_idx = [recipe_soa['id_to_index'][r.id] for r in plan]
+
             # Format response
             response = {
                 'success': True,
@@ -98,16 +232,16 @@ def generate_plan():
                         'protein': recipe.protein,
                         'carbs': recipe.carbs,
                         'fat': recipe.fat,
-                        'ingredients': list(recipe.ingredients)[:8],  # First 8 ingredients
+                        'ingredients': recipe.display_ingredients,  # First 8 ingredients
                         'tags': list(recipe.tags)
                     }
                     for recipe in plan
                 ],
                 'totals': {
-                    'calories': metrics['total_calories'],
-                    'protein': metrics['total_protein'],
-                    'carbs': sum(r.carbs for r in plan),
-                    'fat': sum(r.fat for r in plan)
+                    'calories': float(recipe_soa['calories'][plan_idx].sum()),
+                    'protein': float(recipe_soa['protein'][plan_idx].sum()),
+                    'carbs': float(recipe_soa['carbs'][plan_idx].sum()),
+                    'fat': float(recipe_soa['fat'][plan_idx].sum())
                 },
                 'metrics': {
                     'constraint_satisfaction': metrics['constraint_satisfaction_rate'],
@@ -122,9 +256,9 @@ def generate_plan():
                 'algorithm': algorithm
             }
 
-            return jsonify(response)
+            return ojsonify(response)
         else:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Could not generate meal plan with given constraints',
                 'suggestions': [
@@ -136,7 +270,7 @@ def generate_plan():
             })
 
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
         }), 400
@@ -145,11 +279,7 @@ def generate_plan():
 @app.route('/api/sample-users', methods=['GET'])
 def get_sample_users():
     """Get list of sample users."""
-    from data_loader import load_users
-
     try:
-        users = load_users('data/test_users.json')
-
         sample_users = [
             {
                 'id': user.id,
@@ -160,13 +290,13 @@ def get_sample_users():
                 'allergens': list(user.allergens),
                 'preferences': list(user.preferences)
             }
-            for user in users[:5]  # First 5 sample users
+            for user in _SAMPLE_USERS[:5]  # First 5 sample users
         ]
 
-        return jsonify({'users': sample_users})
+        return ojsonify({'users': sample_users})
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 400
+        return ojsonify({'error': str(e)}), 400
 
 
 if __name__ == '__main__':
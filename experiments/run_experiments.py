@@ -16,16 +16,93 @@ import os
 # Add src directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+import itertools
+import math
 import time
+import types
+from multiprocessing import Pool
+
 import pandas as pd
+import data_loader
 from data_loader import load_recipes, load_users
+from constraints import filter_by_diet_and_allergens
 from baseline import random_baseline_planner
 from oracle import oracle_planner
 from csp_planner import greedy_csp_planner, csp_planner_with_config
 from metrics import evaluate_plan
 
 
-def run_algorithm(algorithm_func, recipes, user, **kwargs):
+# Shared immutable metrics row for failed runs. Using NaN rather than
+# float('inf') lets the CSV step use fillna instead of scanning for
+# infinities, and one read-only dict avoids rebuilding it per failure.
+FAILED_METRICS = types.MappingProxyType({
+    'constraint_satisfaction_rate': 0.0,
+    'calorie_error': math.nan,
+    'protein_error': math.nan,
+    'diversity_score': 0.0,
+    'preference_score': 0.0,
+    'balance_score': 0.0,
+    'total_calories': 0.0,
+    'total_protein': 0.0,
+    'success': False
+})
+
+
+def _summarize(results, groupby_col):
+    """
+    Print a per-group summary of experiment results with one groupby.
+
+    Quality metrics (calorie error, diversity) are averaged over solved
+    runs only, via columns masked to NaN for failures, so a single
+    C-level groupby replaces the per-group boolean-mask scans.
+
+    Args:
+        results: List of result row dicts
+        groupby_col: Column to group on (e.g. 'algorithm', 'beam_width')
+    """
+    df = pd.DataFrame.from_records(results)
+    solved_mask = df['found_solution']
+    df['_calorie_error_solved'] = df['calorie_error'].where(solved_mask)
+    df['_diversity_solved'] = df['diversity_score'].where(solved_mask)
+
+    summary = df.groupby(groupby_col).agg(
+        runs=('found_solution', 'size'),
+        solved=('found_solution', 'sum'),
+        avg_runtime_ms=('runtime_ms', 'mean'),
+        avg_calorie_error=('_calorie_error_solved', 'mean'),
+        avg_diversity=('_diversity_solved', 'mean'),
+    )
+
+    for group, row in summary.iterrows():
+        solved = int(row['solved'])
+        runs = int(row['runs'])
+        print(f"\n{group}:")
+        print(f"  Success: {solved}/{runs} ({solved / runs * 100:.1f}%)")
+        print(f"  Avg Runtime: {row['avg_runtime_ms']:.1f}ms")
+        if solved > 0:
+            print(f"  Avg Calorie Error: {row['avg_calorie_error']:.1f} cal")
+            print(f"  Avg Diversity: {row['avg_diversity']:.1f}/100")
+
+
+def build_user_pools(recipes, users):
+    """
+    Pre-filter the recipe list once per user.
+
+    The diet/allergen filter depends only on the user, so each experiment
+    can reuse the same filtered pool instead of re-scanning all recipes
+    on every planner invocation.
+
+    Args:
+        recipes: List of Recipe objects
+        users: List of User objects
+
+    Returns:
+        dict: user.id -> list of Recipe objects passing diet/allergen filter
+    """
+    return {user.id: filter_by_diet_and_allergens(recipes, user) for user in users}
+
+
+def run_algorithm(algorithm_func, recipes, user, prefiltered=None, **kwargs):
     """
     Run an algorithm and measure performance.
 
@@ -33,38 +110,33 @@ def run_algorithm(algorithm_func, recipes, user, **kwargs):
         algorithm_func: Function to call
         recipes: List of Recipe objects
         user: User object
+        prefiltered: Optional pre-filtered recipe pool for this user
+            (skips the full-database scan inside the planner)
         **kwargs: Additional arguments for algorithm
 
     Returns:
         dict: Results including plan, metrics, and runtime
     """
-    start_time = time.time()
-    plan = algorithm_func(recipes, user, **kwargs)
-    end_time = time.time()
-
-    runtime_ms = (end_time - start_time) * 1000
-
-    metrics = evaluate_plan(plan, user) if plan else {
-        'constraint_satisfaction_rate': 0.0,
-        'calorie_error': float('inf'),
-        'protein_error': float('inf'),
-        'diversity_score': 0.0,
-        'preference_score': 0.0,
-        'balance_score': 0.0,
-        'total_calories': 0.0,
-        'total_protein': 0.0,
-        'success': False
-    }
+    pool = prefiltered if prefiltered is not None else recipes
+
+    start_ns = time.perf_counter_ns()
+    plan = algorithm_func(pool, user, **kwargs)
+    end_ns = time.perf_counter_ns()
+
+    runtime_ms = (end_ns - start_ns) / 1e6
+
+    metrics = evaluate_plan(plan, user) if plan else FAILED_METRICS
 
     return {
         'plan': plan,
         'metrics': metrics,
         'runtime_ms': runtime_ms,
-        'found_solution': plan is not None
+        'found_solution': plan is not None,
+        'filtered_count': len(pool) if prefiltered is not None else None
     }
 
 
-def experiment_1_main_comparison(recipes, users):
+def experiment_1_main_comparison(recipes, users, user_pools):
     """
     Experiment 1: Compare Baseline vs Oracle vs CSP on all users.
     """
@@ -78,15 +150,18 @@ def experiment_1_main_comparison(recipes, users):
         print(f"\nUser: {user.name} ({user.diet_type}, {user.calorie_target}cal, {user.protein_min}g protein)")
 
         # Baseline
-        baseline_result = run_algorithm(random_baseline_planner, recipes, user, seed=42)
+        baseline_result = run_algorithm(random_baseline_planner, recipes, user,
+                                        prefiltered=user_pools[user.id], seed=42)
         print(f"  Baseline: {'SUCCESS' if baseline_result['found_solution'] else 'FAILED'} ({baseline_result['runtime_ms']:.1f}ms)")
 
-        # Oracle (limited for performance)
-        oracle_result = run_algorithm(oracle_planner, recipes, user, max_combinations=10000)
+        # Oracle (exhaustive over the feasible region at this pool size)
+        oracle_result = run_algorithm(oracle_planner, recipes, user,
+                                      prefiltered=user_pools[user.id])
         print(f"  Oracle: {'SUCCESS' if oracle_result['found_solution'] else 'FAILED'} ({oracle_result['runtime_ms']:.1f}ms)")
 
         # CSP
-        csp_result = run_algorithm(greedy_csp_planner, recipes, user, top_k=15)
+        csp_result = run_algorithm(greedy_csp_planner, recipes, user,
+                                   prefiltered=user_pools[user.id], top_k=15)
         print(f"  CSP: {'SUCCESS' if csp_result['found_solution'] else 'FAILED'} ({csp_result['runtime_ms']:.1f}ms)")
 
         # Store results
@@ -104,60 +179,106 @@ def experiment_1_main_comparison(recipes, users):
     # Summary statistics
     print("\n" + "-" * 80)
     print("SUMMARY:")
-    df = pd.DataFrame(results)
-    for algo in ['Baseline', 'Oracle', 'CSP']:
-        algo_results = df[df['algorithm'] == algo]
-        success_rate = (algo_results['found_solution'].sum() / len(algo_results)) * 100
-        avg_runtime = algo_results['runtime_ms'].mean()
-        avg_cal_error = algo_results[algo_results['found_solution']]['calorie_error'].mean()
-        avg_diversity = algo_results[algo_results['found_solution']]['diversity_score'].mean()
-
-        print(f"\n{algo}:")
-        print(f"  Success Rate: {success_rate:.1f}%")
-        print(f"  Avg Runtime: {avg_runtime:.1f}ms")
-        if success_rate > 0:
-            print(f"  Avg Calorie Error: {avg_cal_error:.1f} cal")
-            print(f"  Avg Diversity: {avg_diversity:.1f}/100")
+    _summarize(results, 'algorithm')
 
     return results
 
 
-def experiment_2_beam_width_ablation(recipes, users):
+# Worker-process state for the parallel experiments; set once per worker
+# by _init_worker so tasks only need to carry small (config, user_id)
+# tuples instead of re-pickling the recipe list per task.
+_worker_recipes = None
+_worker_users = None
+_worker_pools = None
+_worker_recipe_rank = None
+
+
+def _init_worker(recipes, users, user_pools,
+                 ingredient_bits, tag_bits, allergen_bits):
+    """Initializer run once in each Pool worker."""
+    global _worker_recipes, _worker_users, _worker_pools, _worker_recipe_rank
+    _worker_recipes = recipes
+    _worker_users = {user.id: user for user in users}
+    _worker_pools = user_pools
+    _worker_recipe_rank = {recipe.id: i for i, recipe in enumerate(recipes)}
+    # Re-seed the token vocabularies for spawn-based platforms (a no-op
+    # under fork, where workers inherit them); diet and allergen checks
+    # resolve masks through these module globals
+    data_loader.INGREDIENT_BITS.update(ingredient_bits)
+    data_loader.TAG_BITS.update(tag_bits)
+    data_loader.ALLERGEN_BITS.update(allergen_bits)
+
+
+def _init_worker_args(recipes, users, user_pools):
+    """initargs tuple for _init_worker, vocabularies included."""
+    return (recipes, users, user_pools,
+            dict(data_loader.INGREDIENT_BITS),
+            dict(data_loader.TAG_BITS),
+            dict(data_loader.ALLERGEN_BITS))
+
+
+def _run_beam_width_case(k, user_id):
+    """One (beam width, user) cell of experiment 2, run in a worker."""
+    user = _worker_users[user_id]
+    result = run_algorithm(csp_planner_with_config, _worker_recipes, user,
+                           prefiltered=_worker_pools[user_id], top_k=k)
+    return {
+        'experiment': 'beam_width_ablation',
+        'user_id': user.id,
+        'user_name': user.name,
+        'beam_width': k,
+        'found_solution': result['found_solution'],
+        'runtime_ms': result['runtime_ms'],
+        **result['metrics']
+    }
+
+
+def _run_dataset_case(size, user_id):
+    """One (dataset size, user) cell of experiment 4, run in a worker."""
+    user = _worker_users[user_id]
+    subset_recipes = _worker_recipes[:size]
+    subset_pool = [r for r in _worker_pools[user_id] if _worker_recipe_rank[r.id] < size]
+    result = run_algorithm(greedy_csp_planner, subset_recipes, user,
+                           prefiltered=subset_pool, top_k=15)
+    return {
+        'experiment': 'dataset_scaling',
+        'user_id': user.id,
+        'user_name': user.name,
+        'dataset_size': size,
+        'found_solution': result['found_solution'],
+        'runtime_ms': result['runtime_ms'],
+        **result['metrics']
+    }
+
+
+def experiment_2_beam_width_ablation(recipes, users, user_pools):
     """
     Experiment 2: Beam width ablation study (k = 5, 10, 15, 20, 30).
+
+    Each (beam width, user) cell is an independent planner invocation, so
+    the grid is distributed over a process pool.
     """
     print("\n" + "=" * 80)
     print("EXPERIMENT 2: BEAM WIDTH ABLATION STUDY")
     print("=" * 80)
 
     beam_widths = [5, 10, 15, 20, 30]
-    results = []
+    cases = list(itertools.product(beam_widths, [user.id for user in users]))
 
-    for k in beam_widths:
-        print(f"\nBeam Width k={k}:")
-        for user in users:
-            result = run_algorithm(csp_planner_with_config, recipes, user, top_k=k)
-            results.append({
-                'experiment': 'beam_width_ablation',
-                'user_id': user.id,
-                'user_name': user.name,
-                'beam_width': k,
-                'found_solution': result['found_solution'],
-                'runtime_ms': result['runtime_ms'],
-                **result['metrics']
-            })
+    with Pool(processes=os.cpu_count(),
+              initializer=_init_worker,
+              initargs=_init_worker_args(recipes, users, user_pools)) as pool:
+        results = pool.starmap(_run_beam_width_case, cases)
 
-        # Summary for this k
-        k_results = [r for r in results if r['beam_width'] == k]
-        success_count = sum(1 for r in k_results if r['found_solution'])
-        avg_runtime = sum(r['runtime_ms'] for r in k_results) / len(k_results)
-        print(f"  Success: {success_count}/{len(users)} ({success_count/len(users)*100:.1f}%)")
-        print(f"  Avg Runtime: {avg_runtime:.1f}ms")
+    # Summary per beam width
+    print("\n" + "-" * 80)
+    print("SUMMARY BY BEAM WIDTH:")
+    _summarize(results, 'beam_width')
 
     return results
 
 
-def experiment_3_constraint_strictness(recipes, users):
+def experiment_3_constraint_strictness(recipes, users, user_pools):
     """
     Experiment 3: Analyze how constraint strictness affects success rate.
     """
@@ -179,7 +300,8 @@ def experiment_3_constraint_strictness(recipes, users):
         else:
             category = 'strict'
 
-        result = run_algorithm(greedy_csp_planner, recipes, user, top_k=15)
+        result = run_algorithm(greedy_csp_planner, recipes, user,
+                               prefiltered=user_pools[user.id], top_k=15)
 
         print(f"\nUser: {user.name} ({category})")
         print(f"  Diet: {user.diet_type}, Allergens: {list(user.allergens)}")
@@ -200,17 +322,12 @@ def experiment_3_constraint_strictness(recipes, users):
     # Summary by category
     print("\n" + "-" * 80)
     print("SUMMARY BY STRICTNESS:")
-    df = pd.DataFrame(results)
-    for category in ['lenient', 'moderate', 'strict']:
-        cat_results = df[df['strictness'] == category]
-        if len(cat_results) > 0:
-            success_rate = (cat_results['found_solution'].sum() / len(cat_results)) * 100
-            print(f"\n{category.capitalize()}: {success_rate:.1f}% success ({cat_results['found_solution'].sum()}/{len(cat_results)})")
+    _summarize(results, 'strictness')
 
     return results
 
 
-def experiment_4_dataset_scaling(recipes, users):
+def experiment_4_dataset_scaling(recipes, users, user_pools):
     """
     Experiment 4: Dataset size scaling (50, 100, 150, 200 recipes).
     """
@@ -219,35 +336,24 @@ def experiment_4_dataset_scaling(recipes, users):
     print("=" * 80)
 
     dataset_sizes = [50, 100, 150, 200]
-    results = []
-
-    for size in dataset_sizes:
-        print(f"\nDataset Size: {size} recipes")
-        subset_recipes = recipes[:size]
+    cases = list(itertools.product(dataset_sizes, [user.id for user in users]))
 
-        for user in users:
-            result = run_algorithm(greedy_csp_planner, subset_recipes, user, top_k=15)
-            results.append({
-                'experiment': 'dataset_scaling',
-                'user_id': user.id,
-                'user_name': user.name,
-                'dataset_size': size,
-                'found_solution': result['found_solution'],
-                'runtime_ms': result['runtime_ms'],
-                **result['metrics']
-            })
+    # The filter preserves recipe order, so workers slice each user's
+    # prefiltered pool by original position instead of refiltering.
+    with Pool(processes=os.cpu_count(),
+              initializer=_init_worker,
+              initargs=_init_worker_args(recipes, users, user_pools)) as pool:
+        results = pool.starmap(_run_dataset_case, cases)
 
-        # Summary for this size
-        size_results = [r for r in results if r['dataset_size'] == size]
-        success_count = sum(1 for r in size_results if r['found_solution'])
-        avg_runtime = sum(r['runtime_ms'] for r in size_results) / len(size_results)
-        print(f"  Success: {success_count}/{len(users)} ({success_count/len(users)*100:.1f}%)")
-        print(f"  Avg Runtime: {avg_runtime:.1f}ms")
+    # Summary per dataset size
+    print("\n" + "-" * 80)
+    print("SUMMARY BY DATASET SIZE:")
+    _summarize(results, 'dataset_size')
 
     return results
 
 
-def experiment_5_failure_analysis(recipes, users):
+def experiment_5_failure_analysis(recipes, users, user_pools):
     """
     Experiment 5: Analyze failure cases.
     """
@@ -259,7 +365,8 @@ def experiment_5_failure_analysis(recipes, users):
     failures = []
 
     for user in users:
-        result = run_algorithm(greedy_csp_planner, recipes, user, top_k=15)
+        result = run_algorithm(greedy_csp_planner, recipes, user,
+                               prefiltered=user_pools[user.id], top_k=15)
 
         if not result['found_solution']:
             failures.append({
@@ -289,13 +396,12 @@ def experiment_5_failure_analysis(recipes, users):
             print(f"    Allergens: {list(user.allergens)}")
             print(f"    Preferences: {list(user.preferences)}")
 
-            # Analyze why it failed
-            from constraints import filter_by_diet_and_allergens
-            available = filter_by_diet_and_allergens(recipes, user)
-            print(f"    Available Recipes: {len(available)}")
+            # Analyze why it failed, from the count recorded during planning
+            available_count = fail['result']['filtered_count']
+            print(f"    Available Recipes: {available_count}")
 
-            if len(available) < 3:
-                print(f"    REASON: Not enough recipes after filtering (need 3, have {len(available)})")
+            if available_count < 3:
+                print(f"    REASON: Not enough recipes after filtering (need 3, have {available_count})")
             else:
                 print(f"    REASON: Could not satisfy calorie/protein constraints with available recipes")
     else:
@@ -316,21 +422,31 @@ def main():
     users = load_users()
     print(f"Loaded {len(recipes)} recipes and {len(users)} users")
 
+    # Filter once per user and share the pools across all experiments
+    user_pools = build_user_pools(recipes, users)
+
     # Run all experiments
     all_results = []
 
-    all_results.extend(experiment_1_main_comparison(recipes, users))
-    all_results.extend(experiment_2_beam_width_ablation(recipes, users))
-    all_results.extend(experiment_3_constraint_strictness(recipes, users))
-    all_results.extend(experiment_4_dataset_scaling(recipes, users))
-    all_results.extend(experiment_5_failure_analysis(recipes, users))
+    all_results.extend(experiment_1_main_comparison(recipes, users, user_pools))
+    all_results.extend(experiment_2_beam_width_ablation(recipes, users, user_pools))
+    all_results.extend(experiment_3_constraint_strictness(recipes, users, user_pools))
+    all_results.extend(experiment_4_dataset_scaling(recipes, users, user_pools))
+    all_results.extend(experiment_5_failure_analysis(recipes, users, user_pools))
 
-    # Save results to CSV
+    # Save results to CSV; one DataFrame built at the very end, with metric
+    # columns downcast instead of left to float64 dtype inference
     output_file = 'experiment_results.csv'
-    df = pd.DataFrame(all_results)
+    df = pd.DataFrame.from_records(all_results)
+    metric_cols = ['runtime_ms', 'constraint_satisfaction_rate', 'calorie_error',
+                   'protein_error', 'diversity_score', 'preference_score',
+                   'balance_score', 'total_calories', 'total_protein']
+    df[metric_cols] = df[metric_cols].astype('float32')
 
-    # Replace infinity with a large number for CSV compatibility
-    df = df.replace([float('inf'), -float('inf')], 999999)
+    # Replace failed-run NaN sentinels with a large number for CSV
+    # compatibility — metric columns only, so structural NaNs (e.g. the
+    # config columns other experiments don't set) stay empty cells
+    df[metric_cols] = df[metric_cols].fillna(999999)
 
     df.to_csv(output_file, index=False)
     print("\n" + "=" * 80)
@@ -349,9 +465,14 @@ def main():
             print(f"\nUser: {user.name} ({user.diet_type})")
             print(f"Target: {user.calorie_target}cal, {user.protein_min}g protein minimum")
             print(f"Meal Plan:")
+            # Single pass: accumulate totals while printing each meal
+            total_cal = 0.0
+            total_prot = 0.0
             for i, recipe in enumerate(plan, 1):
                 print(f"  {i}. {recipe.name} - {recipe.calories}cal, {recipe.protein}g protein")
-            print(f"Totals: {sum(r.calories for r in plan):.0f}cal, {sum(r.protein for r in plan):.0f}g protein")
+                total_cal += recipe.calories
+                total_prot += recipe.protein
+            print(f"Totals: {total_cal:.0f}cal, {total_prot:.0f}g protein")
 
 
 if __name__ == '__main__':
@@ -8,13 +8,18 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from data_loader import load_recipes, Recipe, User
+from data_loader import load_recipes, load_users, Recipe, User
 from csp_planner import greedy_csp_planner
 from baseline import random_baseline_planner
 from metrics import evaluate_plan
 import time
 
 
+def _normalize_tokens(raw):
+    """Split comma-separated input into trimmed lowercase tokens, dropping empties."""
+    return list(filter(None, (token.strip() for token in raw.lower().split(','))))
+
+
 def print_header():
     """Print welcome header."""
     print("\n" + "=" * 70)
@@ -93,7 +98,7 @@ def get_user_input():
     print("  Or press Enter to skip")
 
     allergen_input = input("Allergens: ").strip()
-    allergens = [a.strip().lower() for a in allergen_input.split(',') if a.strip()] if allergen_input else []
+    allergens = _normalize_tokens(allergen_input) if allergen_input else []
 
     # Get preferences
     print("\nWhat are your favorite ingredients? (comma-separated)")
@@ -101,7 +106,7 @@ def get_user_input():
     print("  Or press Enter to skip")
 
     pref_input = input("Preferences: ").strip()
-    preferences = [p.strip().lower() for p in pref_input.split(',') if p.strip()] if pref_input else []
+    preferences = _normalize_tokens(pref_input) if pref_input else []
 
     # Create User object
     user = User(
@@ -157,7 +162,7 @@ def display_meal_plan(plan, user, metrics, runtime_ms):
               f"{recipe.protein:.0f}g protein | "
               f"{recipe.carbs:.0f}g carbs | "
               f"{recipe.fat:.0f}g fat")
-        print(f"  Ingredients: {', '.join(sorted(list(recipe.ingredients)[:5]))}"
+        print(f"  Ingredients: {', '.join(recipe.display_ingredients[:5])}"
               f"{', ...' if len(recipe.ingredients) > 5 else ''}")
 
         total_cal += recipe.calories
@@ -213,6 +218,8 @@ def main_menu():
     print("\nLoading recipe database...")
     try:
         recipes = load_recipes('data/recipes.csv')
+        # Sample users are read once here; the menu options reuse them
+        users = load_users('data/test_users.json')
         print(f"[OK] Loaded {len(recipes)} recipes")
     except Exception as e:
         print(f"[ERROR] Could not load recipes: {e}")
@@ -240,18 +247,15 @@ def main_menu():
             print("Generating your personalized meal plan...")
             print("-" * 70)
 
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             plan = greedy_csp_planner(recipes, user, top_k=15)
-            runtime_ms = (time.time() - start_time) * 1000
+            runtime_ms = (time.perf_counter_ns() - start_ns) / 1e6
 
             metrics = evaluate_plan(plan, user) if plan else {}
             display_meal_plan(plan, user, metrics, runtime_ms)
 
         elif choice in ['2', '3', '4']:
             # Sample users
-            from data_loader import load_users
-            users = load_users('data/test_users.json')
-
             sample_map = {'2': 0, '3': 1, '4': 2}  # Alex, Sarah, Mike
             user = users[sample_map[choice]]
 
@@ -262,18 +266,15 @@ def main_menu():
             print(f"  Allergens: {list(user.allergens) if user.allergens else 'None'}")
 
             print("\nGenerating meal plan...")
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             plan = greedy_csp_planner(recipes, user, top_k=15)
-            runtime_ms = (time.time() - start_time) * 1000
+            runtime_ms = (time.perf_counter_ns() - start_ns) / 1e6
 
             metrics = evaluate_plan(plan, user) if plan else {}
             display_meal_plan(plan, user, metrics, runtime_ms)
 
         elif choice == '5':
             # View all sample users
-            from data_loader import load_users
-            users = load_users('data/test_users.json')
-
             print("\n" + "=" * 70)
             print("SAMPLE USERS")
             print("=" * 70)
@@ -0,0 +1,208 @@
+"""
+Numeric scoring kernel for the CSP planner, JIT-compiled with Numba.
+
+The calorie/protein part of the greedy heuristic is pure arithmetic over
+per-candidate arrays, so it is compiled with @njit when Numba is
+installed. Numba is optional: if the import fails the same function runs
+as plain Python over NumPy arrays, just without the JIT speedup.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit when Numba is not installed."""
+        def decorate(func):
+            return func
+        # Support both @njit and @njit(...) forms
+        if args and callable(args[0]):
+            return args[0]
+        return decorate
+
+
+@njit(cache=True, fastmath=True)
+def score_candidates(cand_calories, cand_protein, partial_calories, partial_protein,
+                     calorie_target, protein_min, w_calorie, w_protein):
+    """
+    Compute the numeric (calorie + protein) heuristic term for all candidates.
+
+    Args:
+        cand_calories: float32 array of candidate recipe calories
+        cand_protein: float32 array of candidate recipe protein
+        partial_calories: Calories already in the partial plan
+        partial_protein: Protein already in the partial plan
+        calorie_target: User's daily calorie target
+        protein_min: User's minimum protein requirement
+        w_calorie: Weight on calorie error (includes any final-slot boost)
+        w_protein: Weight on protein deficit
+
+    Returns:
+        float32 array of partial heuristic scores (lower is better)
+    """
+    n = cand_calories.shape[0]
+    scores = np.empty(n, dtype=np.float32)
+    for i in range(n):
+        calorie_error = abs(partial_calories + cand_calories[i] - calorie_target)
+        protein_deficit = protein_min - (partial_protein + cand_protein[i])
+        if protein_deficit < 0:
+            protein_deficit = 0.0
+        scores[i] = w_calorie * calorie_error + w_protein * protein_deficit
+    return scores
+
+
+@njit(cache=True)
+def _popcount64(x):
+    """SWAR popcount of a uint64 (Numba has no bit_count builtin)."""
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+@njit(cache=True, fastmath=True)
+def score_candidates_full(cand_calories, cand_protein, cand_ing_lo, cand_ing_hi,
+                          cand_tag_lo, cand_ing_count,
+                          partial_calories, partial_protein,
+                          partial_ing_lo, partial_ing_hi,
+                          partial_ovl_lo, partial_ovl_hi,
+                          partial_tag_lo, partial_total_len,
+                          pref_lo, pref_hi, n_prefs,
+                          calorie_target, protein_min, w_calorie):
+    """
+    Compute the complete greedy heuristic for all candidates in one pass.
+
+    Ingredient bitmasks travel as two uint64 lanes (lo = bits 0-63,
+    hi = bits 64-127) so the overlap/diversity/preference terms reduce to
+    bitwise ops plus popcounts inside the compiled loop. Mirrors
+    heuristics.heuristic_from_state exactly; the final-slot calorie boost
+    is folded into w_calorie by the caller.
+
+    Args:
+        cand_calories, cand_protein: float32 candidate nutrient columns
+        cand_ing_lo, cand_ing_hi: uint64 candidate ingredient-mask lanes
+        cand_tag_lo: uint64 candidate tag masks (single lane)
+        cand_ing_count: float32 candidate ingredient counts
+        partial_calories, partial_protein: partial-plan sums
+        partial_ing_lo, partial_ing_hi: partial-plan ingredient-union lanes
+        partial_ovl_lo, partial_ovl_hi: partial-plan overlap-mask lanes
+        partial_tag_lo: partial-plan tag-union mask
+        partial_total_len: total ingredient count across the partial plan
+        pref_lo, pref_hi: user preference-mask lanes
+        n_prefs: number of user preferences (0 -> neutral 50 score)
+        calorie_target, protein_min: user targets
+        w_calorie: weight on calorie error (includes any final-slot boost)
+
+    Returns:
+        float32 array of heuristic scores (lower is better)
+    """
+    n = cand_calories.shape[0]
+    scores = np.empty(n, dtype=np.float32)
+    for i in range(n):
+        new_calories = partial_calories + cand_calories[i]
+        calorie_error = abs(new_calories - calorie_target)
+
+        # Cheap constraint first: calories only accumulate, so overshooting
+        # target + 300 is unrecoverable — skip the popcount-heavy terms
+        # (mirrors heuristics.INFEASIBLE_PENALTY)
+        if new_calories > calorie_target + 300.0:
+            scores[i] = 1e6 + calorie_error
+            continue
+
+        protein_deficit = protein_min - (partial_protein + cand_protein[i])
+        if protein_deficit < 0:
+            protein_deficit = 0.0
+
+        union_lo = partial_ing_lo | cand_ing_lo[i]
+        union_hi = partial_ing_hi | cand_ing_hi[i]
+        overlaps = (_popcount64(partial_ovl_lo | (partial_ing_lo & cand_ing_lo[i])) +
+                    _popcount64(partial_ovl_hi | (partial_ing_hi & cand_ing_hi[i])))
+
+        unique_ingredients = _popcount64(union_lo) + _popcount64(union_hi)
+        unique_tags = _popcount64(partial_tag_lo | cand_tag_lo[i])
+        total_ingredients = partial_total_len + cand_ing_count[i]
+        overlap_ratio = 1.0 - unique_ingredients / total_ingredients
+        diversity = (unique_ingredients * 2.0 + unique_tags - overlap_ratio * 20.0) * 2.0
+        if diversity > 100.0:
+            diversity = 100.0
+        elif diversity < 0.0:
+            diversity = 0.0
+
+        if n_prefs > 0:
+            matches = _popcount64(pref_lo & union_lo) + _popcount64(pref_hi & union_hi)
+            preference = matches / n_prefs * 100.0
+        else:
+            preference = 50.0
+
+        scores[i] = (w_calorie * calorie_error +
+                     2.0 * protein_deficit +
+                     10.0 * overlaps +
+                     0.6 * (100.0 - diversity) +
+                     0.4 * (100.0 - preference))
+    return scores
+
+
+@njit(cache=True, fastmath=True)
+def balance_score(total_protein, total_carbs, total_fat):
+    """
+    Macronutrient balance score (0-100) from total macro grams.
+
+    Compiled form of the arithmetic in metrics.calculate_balance_score:
+    macro-calorie percentages, deviation from the ideal ranges
+    (protein 25-35%, carbs 45-55%, fat 20-30%), scaled to 0-100.
+    """
+    protein_cals = total_protein * 4.0
+    carbs_cals = total_carbs * 4.0
+    fat_cals = total_fat * 9.0
+    total_cals = protein_cals + carbs_cals + fat_cals
+    if total_cals == 0.0:
+        return 0.0
+
+    protein_pct = protein_cals / total_cals * 100.0
+    carbs_pct = carbs_cals / total_cals * 100.0
+    fat_pct = fat_cals / total_cals * 100.0
+
+    protein_dev = 0.0
+    if protein_pct < 25.0:
+        protein_dev = 25.0 - protein_pct
+    elif protein_pct > 35.0:
+        protein_dev = protein_pct - 35.0
+
+    carbs_dev = 0.0
+    if carbs_pct < 45.0:
+        carbs_dev = 45.0 - carbs_pct
+    elif carbs_pct > 55.0:
+        carbs_dev = carbs_pct - 55.0
+
+    fat_dev = 0.0
+    if fat_pct < 20.0:
+        fat_dev = 20.0 - fat_pct
+    elif fat_pct > 30.0:
+        fat_dev = fat_pct - 30.0
+
+    total_deviation = protein_dev + carbs_dev + fat_dev
+    score = 100.0 - total_deviation / 60.0 * 100.0
+    if score < 0.0:
+        score = 0.0
+    return score
+
+
+def warmup():
+    """
+    Trigger JIT compilation once at startup.
+
+    Call this before serving requests so the first user doesn't pay the
+    one-time Numba compilation cost. No-op when Numba is unavailable.
+    """
+    dummy = np.zeros(1, dtype=np.float32)
+    score_candidates(dummy, dummy, 0.0, 0.0, 0.0, 0.0, 1.0, 2.0)
+    zero64 = np.uint64(0)
+    dummy64 = np.zeros(1, dtype=np.uint64)
+    score_candidates_full(dummy, dummy, dummy64, dummy64, dummy64, np.ones(1, dtype=np.float32),
+                          0.0, 0.0, zero64, zero64, zero64, zero64, zero64, 0.0,
+                          zero64, zero64, 0, 0.0, 0.0, 1.0)
+    balance_score(1.0, 1.0, 1.0)
@@ -5,8 +5,9 @@ Purpose: Establishes lower bound performance (minimum expected).
 Algorithm: Random selection filtered only by calorie limits.
 """
 
-import random
-from constraints import filter_by_diet_and_allergens
+import numpy as np
+
+from constraints import get_available
 
 
 def random_baseline_planner(recipes, user, num_meals=3, max_attempts=1000, seed=42):
@@ -15,9 +16,15 @@ def random_baseline_planner(recipes, user, num_meals=3, max_attempts=1000, seed=
 
     Approach:
     1. Filter recipes by diet and allergens
-    2. Randomly sample 3 meals
-    3. Check if total calories are within reasonable range
-    4. Repeat until valid plan found or max attempts reached
+    2. Draw random samples in vectorized batches (random sort keys per
+       attempt, argpartition picks num_meals distinct recipes per row)
+    3. Check calorie and protein constraints for a whole batch in one
+       vectorized pass
+    4. Return the first attempt that satisfies both, or None after
+       max_attempts samples
+
+    Still a uniform random baseline — the batch just replaces the Python
+    sample-and-check retry loop with array arithmetic.
 
     Args:
         recipes: List of Recipe objects
@@ -29,32 +36,43 @@ def random_baseline_planner(recipes, user, num_meals=3, max_attempts=1000, seed=
     Returns:
         List of Recipe objects (meal plan) or None if no solution found
     """
-    random.seed(seed)
-
     # Pre-filter by diet and allergens (hard constraints)
-    available = filter_by_diet_and_allergens(recipes, user)
+    available = get_available(recipes, user)
 
     if len(available) < num_meals:
         # Not enough recipes to create a plan
         return None
 
-    # Try random sampling
-    for attempt in range(max_attempts):
-        # Randomly sample num_meals recipes without replacement
-        plan = random.sample(available, num_meals)
+    cal_arr = np.asarray([r.calories for r in available], dtype=np.float32)
+    prot_arr = np.asarray([r.protein for r in available], dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    calorie_tolerance = 300  # Same as other algorithms
+
+    # Batched so easy cases (valid plan in the first few draws) don't pay
+    # for all max_attempts samples, while hard cases stay vectorized
+    batch_size = 200
+    for start in range(0, max_attempts, batch_size):
+        attempts = min(batch_size, max_attempts - start)
+
+        # One random key per (attempt, recipe); taking the num_meals
+        # smallest keys per row is an unbiased sample without replacement.
+        # kth=num_meals - 1 keeps the partition in bounds when the pool
+        # has exactly num_meals recipes.
+        keys = rng.random((attempts, len(available)))
+        idx = np.argpartition(keys, num_meals - 1, axis=1)[:, :num_meals]
+
+        total_calories = cal_arr[idx].sum(axis=1)
+        total_protein = prot_arr[idx].sum(axis=1)
 
-        # Check basic calorie constraint (wide tolerance)
-        total_calories = sum(recipe.calories for recipe in plan)
-        calorie_tolerance = 300  # Same as other algorithms
+        ok = ((np.abs(total_calories - user.calorie_target) <= calorie_tolerance) &
+              (total_protein >= user.protein_min))
 
-        if abs(total_calories - user.calorie_target) <= calorie_tolerance:
-            # Check protein constraint
-            total_protein = sum(recipe.protein for recipe in plan)
-            if total_protein >= user.protein_min:
-                # Found a valid plan
-                return plan
+        if ok.any():
+            first_valid = int(np.argmax(ok))
+            return [available[j] for j in idx[first_valid]]
 
-    # Failed to find a plan after max_attempts
+    # No valid plan within max_attempts samples
     return None
 
 
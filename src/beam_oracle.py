@@ -0,0 +1,157 @@
+"""
+Beam-search oracle: iterative level-by-level search with bound pruning.
+
+Replaces the exhaustive-combination oracle on the web app path. Instead of
+enumerating up to max_combinations 3-meal combinations, it fills one meal
+slot per level, keeping only the most promising partial plans (the beam)
+and discarding any partial that provably cannot reach the calorie/protein
+window with the slots it has left. Complete plans are still ranked with
+the same oracle scoring function, so plan quality stays comparable while
+the enumeration drops from O(n^3) to O(beam_width * branch_factor * levels).
+"""
+
+import heapq
+from operator import itemgetter
+
+from constraints import get_available, violates_hard_constraints
+from oracle import oracle_scoring_function
+
+
+def beam_oracle(recipes, user, num_meals=3, beam_width=32, branch_factor=10,
+                calorie_tolerance=300):
+    """
+    Oracle-quality meal planning via beam search with branch-and-bound pruning.
+
+    Approach:
+    1. Filter recipes by diet and allergens
+    2. For each meal slot, extend every partial plan in the beam with its
+       branch_factor closest-to-even-calorie-share candidates
+    3. Prune any partial whose best achievable calorie/protein totals
+       (using the domain's min/max per remaining slot) fall outside the
+       hard-constraint window
+    4. Keep the beam_width best partials per level, ranked by pro-rata
+       calorie distance plus pro-rata protein deficit
+    5. Score complete valid plans with oracle_scoring_function, return best
+
+    Args:
+        recipes: List of Recipe objects
+        user: User object
+        num_meals: Number of meals to select (default: 3)
+        beam_width: Partial plans kept per level (default: 32)
+        branch_factor: Candidates tried per partial per level (default: 10)
+        calorie_tolerance: Calorie tolerance for the hard constraint
+
+    Returns:
+        List of Recipe objects (best meal plan found) or None
+    """
+    available = get_available(recipes, user)
+
+    if len(available) < num_meals:
+        return None
+
+    # Domain-wide bounds for the feasibility pruning
+    min_cal = min(r.calories for r in available)
+    max_cal = max(r.calories for r in available)
+    max_prot = max(r.protein for r in available)
+
+    cal_lower = user.calorie_target - calorie_tolerance
+    cal_upper = user.calorie_target + calorie_tolerance
+
+    best_plan = None
+    best_score = float('inf')
+
+    # Beam entries: (plan tuple, calorie sum, protein sum)
+    beam = [((), 0.0, 0.0)]
+
+    for level in range(num_meals):
+        remaining = num_meals - level - 1
+        next_beam = []
+
+        for plan, cal_sum, prot_sum in beam:
+            used_ids = {r.id for r in plan}
+
+            # Greedy candidate ordering: closest to an even share of the
+            # calories still needed by this and the remaining slots.
+            # nsmallest keeps a k-sized heap instead of sorting the whole
+            # pool per partial (O(N log k) vs O(N log N))
+            share = (user.calorie_target - cal_sum) / (remaining + 1)
+            candidates = heapq.nsmallest(
+                branch_factor,
+                (r for r in available if r.id not in used_ids),
+                key=lambda r: abs(r.calories - share)
+            )
+
+            for recipe in candidates:
+                new_cal = cal_sum + recipe.calories
+                new_prot = prot_sum + recipe.protein
+
+                # Bound pruning: achievable window with the remaining slots
+                if new_cal + remaining * min_cal > cal_upper:
+                    continue
+                if new_cal + remaining * max_cal < cal_lower:
+                    continue
+                if new_prot + remaining * max_prot < user.protein_min:
+                    continue
+
+                new_plan = plan + (recipe,)
+
+                if remaining == 0:
+                    # Complete assignment: verify and score
+                    full_plan = list(new_plan)
+                    if violates_hard_constraints(full_plan, user, calorie_tolerance):
+                        continue
+                    score = oracle_scoring_function(full_plan, user)
+                    if score < best_score:
+                        best_score = score
+                        best_plan = full_plan
+                else:
+                    # Pro-rata priority: how far off-track is this partial?
+                    filled = level + 1
+                    priority = (abs(new_cal - user.calorie_target * filled / num_meals) +
+                                max(0.0, user.protein_min * filled / num_meals - new_prot))
+                    next_beam.append((priority, new_plan, new_cal, new_prot))
+
+        if remaining == 0:
+            break
+
+        if not next_beam:
+            return best_plan  # Every partial was pruned
+
+        # Keep the beam_width most promising partials (partial selection,
+        # not a full sort of every surviving expansion)
+        beam = [(plan, cal_sum, prot_sum)
+                for _, plan, cal_sum, prot_sum
+                in heapq.nsmallest(beam_width, next_beam, key=itemgetter(0))]
+
+    return best_plan
+
+
+if __name__ == '__main__':
+    # Compare beam oracle against the exhaustive oracle
+    from data_loader import load_recipes, load_users
+    from oracle import oracle_planner
+    from metrics import print_plan_evaluation
+    import time
+
+    recipes = load_recipes()
+    users = load_users()
+
+    print("Testing Beam Oracle (Beam Search with Pruning)")
+    print("=" * 60)
+
+    for user in users[:3]:
+        print(f"\nUser: {user.name} ({user.diet_type}, {user.calorie_target}cal, {user.protein_min}g protein)")
+
+        start_time = time.time()
+        plan = beam_oracle(recipes, user)
+        beam_ms = (time.time() - start_time) * 1000
+
+        start_time = time.time()
+        exhaustive = oracle_planner(recipes, user)
+        exhaustive_ms = (time.time() - start_time) * 1000
+
+        print(f"Beam: {'SUCCESS' if plan else 'FAILED'} ({beam_ms:.2f}ms) | "
+              f"Exhaustive: {'SUCCESS' if exhaustive else 'FAILED'} ({exhaustive_ms:.2f}ms)")
+
+        if plan:
+            print_plan_evaluation(plan, user)
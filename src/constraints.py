@@ -3,6 +3,46 @@ Constraint checking module for CSP meal planner.
 Handles both hard constraints (must be satisfied) and soft constraints (preferences).
 """
 
+from operator import attrgetter
+
+from data_loader import TAG_BITS, tokens_to_mask
+
+# map(attrgetter, plan) keeps the fallback plan sums in the C layer
+_get_calories = attrgetter('calories')
+_get_protein = attrgetter('protein')
+
+
+# Acceptable tags per diet type; diets not listed here are checked by
+# other rules (protein threshold or no restriction)
+_DIET_TAGS = {
+    'vegan': ('vegan',),
+    'vegetarian': ('vegan', 'vegetarian'),
+    'pescatarian': ('vegan', 'vegetarian', 'pescatarian'),
+    'keto': ('keto',),
+    'gluten-free': ('gluten-free',),
+}
+
+# (diet_type, vocab size) -> combined tag bitmask; keyed on vocab size so
+# the cache refreshes if the tag vocabulary grows after a later load
+_diet_mask_cache = {}
+
+# diet_type -> pre-bucketed recipe list for the loaded database, built by
+# rebuild_indexes. _indexed_recipes identifies which list the buckets
+# describe, so filtering a subset (e.g. dataset-scaling experiments)
+# falls back to the full scan.
+DIET_INDEX = {}
+_indexed_recipes = None
+
+
+def _diet_tag_mask(diet_type):
+    """Combined bitmask of the tags acceptable for a diet type."""
+    key = (diet_type, len(TAG_BITS))
+    mask = _diet_mask_cache.get(key)
+    if mask is None:
+        mask = tokens_to_mask(_DIET_TAGS[diet_type], TAG_BITS)
+        _diet_mask_cache[key] = mask
+    return mask
+
 
 def is_diet_compatible(recipe, user):
     """
@@ -24,38 +64,40 @@ def is_diet_compatible(recipe, user):
     Returns:
         bool: True if recipe matches user's diet type
     """
-    diet_type = user.diet_type
-
-    if diet_type == 'vegan':
-        return recipe.has_tag('vegan')
+    return _diet_ok(recipe, user.diet_type)
 
-    elif diet_type == 'vegetarian':
-        # Vegetarian accepts vegan and vegetarian recipes
-        return recipe.has_tag('vegan') or recipe.has_tag('vegetarian')
 
-    elif diet_type == 'pescatarian':
-        # Pescatarian accepts vegan, vegetarian, and pescatarian recipes
-        return (recipe.has_tag('vegan') or
-                recipe.has_tag('vegetarian') or
-                recipe.has_tag('pescatarian'))
+def _diet_ok(recipe, diet_type):
+    """Diet-compatibility rule keyed on the diet type string."""
+    # Tag-gated diets reduce to one AND against the precomputed mask
+    if diet_type in _DIET_TAGS:
+        return (recipe.tag_mask & _diet_tag_mask(diet_type)) != 0
 
-    elif diet_type == 'high-protein':
+    if diet_type == 'high-protein':
         # High-protein requires >= 25g protein per meal
         return recipe.protein >= 25
 
-    elif diet_type == 'keto':
-        return recipe.has_tag('keto')
+    # Balanced (or unknown, defensively) accepts all recipes
+    return True
 
-    elif diet_type == 'gluten-free':
-        return recipe.has_tag('gluten-free')
 
-    elif diet_type == 'balanced':
-        # Balanced diet accepts all recipes
-        return True
+def rebuild_indexes(recipes):
+    """
+    (Re)build the diet-type recipe buckets for a loaded recipe list.
 
-    else:
-        # Unknown diet type - accept all (defensive)
-        return True
+    Called by data_loader.load_recipes after every load so that
+    filter_by_diet_and_allergens can start from the (much smaller)
+    per-diet bucket instead of running the diet rule on every recipe.
+
+    Args:
+        recipes: Full list of loaded Recipe objects
+    """
+    global _indexed_recipes
+    DIET_INDEX.clear()
+    _available_cache.clear()
+    for diet_type in (*_DIET_TAGS, 'high-protein'):
+        DIET_INDEX[diet_type] = [r for r in recipes if _diet_ok(r, diet_type)]
+    _indexed_recipes = recipes
 
 
 def has_allergen(recipe, user):
@@ -69,13 +111,12 @@ def has_allergen(recipe, user):
     Returns:
         bool: True if recipe contains allergens (should be excluded)
     """
-    for allergen in user.allergens:
-        if recipe.contains_allergen(allergen):
-            return True
-    return False
+    # Per-recipe allergen masks are built (lazily) by substring matching
+    # once, so the per-call check is a single bitwise AND
+    return (recipe.allergen_mask & user.allergen_mask) != 0
 
 
-def check_calorie_constraint(plan, user, tolerance=300):
+def check_calorie_constraint(plan, user, tolerance=300, total_calories=None):
     """
     Check if meal plan's total calories are within target range (hard constraint).
 
@@ -83,28 +124,32 @@ def check_calorie_constraint(plan, user, tolerance=300):
         plan: List of Recipe objects
         user: User object
         tolerance: Calorie tolerance in either direction (default: 300)
+        total_calories: Precomputed calorie total (skips the plan walk)
 
     Returns:
         bool: True if total calories within target ± tolerance
     """
-    total_calories = sum(recipe.calories for recipe in plan)
+    if total_calories is None:
+        total_calories = sum(map(_get_calories, plan))
     lower_bound = user.calorie_target - tolerance
     upper_bound = user.calorie_target + tolerance
     return lower_bound <= total_calories <= upper_bound
 
 
-def check_protein_constraint(plan, user):
+def check_protein_constraint(plan, user, total_protein=None):
     """
     Check if meal plan meets minimum protein requirement (hard constraint).
 
     Args:
         plan: List of Recipe objects
         user: User object
+        total_protein: Precomputed protein total (skips the plan walk)
 
     Returns:
         bool: True if total protein >= user's minimum
     """
-    total_protein = sum(recipe.protein for recipe in plan)
+    if total_protein is None:
+        total_protein = sum(map(_get_protein, plan))
     return total_protein >= user.protein_min
 
 
@@ -152,14 +197,23 @@ def filter_by_diet_and_allergens(recipes, user, exclude_ids=None):
     if exclude_ids is None:
         exclude_ids = set()
 
+    # Start from the pre-bucketed diet index when filtering the loaded
+    # database itself; a subset list still gets the full per-recipe check
+    if recipes is _indexed_recipes:
+        candidates = DIET_INDEX.get(user.diet_type, recipes)
+        diet_checked = True
+    else:
+        candidates = recipes
+        diet_checked = False
+
     filtered = []
-    for recipe in recipes:
+    for recipe in candidates:
         # Skip already used recipes
         if recipe.id in exclude_ids:
             continue
 
-        # Check diet compatibility
-        if not is_diet_compatible(recipe, user):
+        # Check diet compatibility (already guaranteed inside a bucket)
+        if not diet_checked and not is_diet_compatible(recipe, user):
             continue
 
         # Check allergens
@@ -171,12 +225,57 @@ def filter_by_diet_and_allergens(recipes, user, exclude_ids=None):
     return filtered
 
 
-def count_satisfied_constraints(plan, user):
+# (diet_type, allergen_mask) -> filtered pool for the loaded database;
+# the filter result depends only on those two user fields, so planners
+# sharing a user (or users with identical constraints) reuse one scan.
+# Cleared by rebuild_indexes on every reload.
+_available_cache = {}
+
+
+def get_available(recipes, user):
+    """
+    Memoized filter_by_diet_and_allergens for the loaded recipe database.
+
+    Baseline, oracle, and CSP planners all pre-filter the same pool for
+    the same user; this caches the result per (diet type, allergen mask)
+    so each distinct constraint profile pays one scan per load. Subset
+    lists (e.g. dataset-scaling experiments) bypass the cache.
+
+    Args:
+        recipes: List of Recipe objects
+        user: User object
+
+    Returns:
+        List of Recipe objects that pass hard constraints. Treat it as
+        read-only: the list is shared across callers.
+    """
+    if recipes is not _indexed_recipes:
+        return filter_by_diet_and_allergens(recipes, user)
+
+    key = (user.diet_type, user.allergen_mask)
+    pool = _available_cache.get(key)
+    if pool is None:
+        pool = filter_by_diet_and_allergens(recipes, user)
+        _available_cache[key] = pool
+    return pool
+
+
+def count_satisfied_constraints(plan, user, totals=None):
     """
     Count how many constraints are satisfied (for evaluation metrics).
 
+    Args:
+        plan: List of Recipe objects
+        user: User object
+        totals: Optional (total_calories, total_protein) pair so callers
+            that already summed the plan don't pay two more walks
+
     Returns a tuple: (satisfied_count, total_count)
     """
+    total_calories = total_protein = None
+    if totals is not None:
+        total_calories, total_protein = totals
+
     satisfied = 0
     total = 0
 
@@ -194,12 +293,12 @@ def count_satisfied_constraints(plan, user):
 
     # Calorie constraint (plan-level)
     total += 1
-    if check_calorie_constraint(plan, user):
+    if check_calorie_constraint(plan, user, total_calories=total_calories):
         satisfied += 1
 
     # Protein constraint (plan-level)
     total += 1
-    if check_protein_constraint(plan, user):
+    if check_protein_constraint(plan, user, total_protein=total_protein):
         satisfied += 1
 
     return satisfied, total
@@ -25,11 +25,24 @@ Algorithm: Greedy Heuristic-Guided Backtracking Search
 3. Return first valid complete assignment found
 """
 
-from constraints import filter_by_diet_and_allergens, violates_hard_constraints
-from heuristics import greedy_recipe_selector
+import os
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 
-def greedy_csp_planner(recipes, user, num_meals=3, current_plan=None, used_ids=None, top_k=15):
+import data_loader
+from constraints import get_available, violates_hard_constraints
+from data_loader import get_recipe_soa
+from heuristics import (INFEASIBLE_PENALTY, PartialPlanState,
+                        greedy_recipe_selector)
+
+# Finite "never pick this" score for the batched matrices: large enough to
+# lose every comparison, without inf's exceptional-value arithmetic
+FLOAT_MAX = float(np.finfo(np.float32).max)
+
+
+def greedy_csp_planner(recipes, user, num_meals=3, current_plan=None, used_ids=None, top_k=15,
+                       state=None):
     """
     CSP meal planner using greedy heuristic-guided backtracking search.
 
@@ -40,6 +53,8 @@ def greedy_csp_planner(recipes, user, num_meals=3, current_plan=None, used_ids=N
         current_plan: List of Recipe objects (partial assignment, used in recursion)
         used_ids: Set of recipe IDs already in plan (avoid duplicates)
         top_k: Beam width for greedy search (default: 15)
+        state: PartialPlanState for current_plan (built on first call,
+            extended incrementally through recursion)
 
     Returns:
         List of Recipe objects (complete meal plan) or None if no solution found
@@ -49,41 +64,102 @@ def greedy_csp_planner(recipes, user, num_meals=3, current_plan=None, used_ids=N
         current_plan = []
     if used_ids is None:
         used_ids = set()
+    if state is None:
+        state = PartialPlanState.from_plan(current_plan)
+
+    # Domain reduction happens ONCE here: diet and allergen compatibility
+    # never changes with search depth, so the recursion only needs to drop
+    # already-used recipes from this base domain
+    base_domain = get_available(recipes, user)
+
+    if not base_domain:
+        return None
+
+    # Domain-wide nutrient bounds for forward checking (the domain only
+    # shrinks as recipes are used, so these stay valid at every depth)
+    bounds = (min(r.calories for r in base_domain),
+              max(r.calories for r in base_domain),
+              max(r.protein for r in base_domain))
+
+    return _fill_slots(base_domain, user, num_meals, current_plan, used_ids, top_k, state,
+                       bounds)
+
+
+def _fill_slots(base_domain, user, num_meals, current_plan, used_ids, top_k, state, bounds):
+    """
+    Recursive slot-filling over the pre-filtered base domain.
 
+    Args:
+        base_domain: List of Recipe objects already filtered by diet/allergens
+        user: User object
+        num_meals: Number of meals to select
+        current_plan: List of Recipe objects (partial assignment)
+        used_ids: Set of recipe IDs already in plan
+        top_k: Beam width for greedy search
+        state: PartialPlanState for current_plan
+        bounds: (min_cal, max_cal, max_prot) over the base domain, used to
+            prune candidates that cannot reach a feasible total
+
+    Returns:
+        List of Recipe objects (complete meal plan) or None
+    """
     # BASE CASE: Complete assignment
     if len(current_plan) == num_meals:
         # Check hard constraints on complete plan
         if not violates_hard_constraints(current_plan, user):
-            return current_plan  # Found valid solution
+            # Copy: the recursion mutates current_plan while backtracking
+            return list(current_plan)
         else:
             return None  # Violates hard constraints, backtrack
 
-    # RECURSIVE CASE: Fill next slot
-
-    # Domain reduction: filter by diet and allergens, exclude already-used recipes
-    available = filter_by_diet_and_allergens(recipes, user, exclude_ids=used_ids)
+    # RECURSIVE CASE: Fill next slot — only the used-id exclusion varies
+    # with depth, not the diet/allergen filtering
+    available = [recipe for recipe in base_domain if recipe.id not in used_ids]
 
     if not available:
         return None  # No available recipes, backtrack
 
     # GREEDY HEURISTIC: Select top-k most promising candidates
-    candidates = greedy_recipe_selector(available, current_plan, user, top_k, num_meals)
+    candidates = greedy_recipe_selector(available, current_plan, user, top_k, num_meals,
+                                        state=state)
+
+    # FORWARD CHECKING: with the best/worst the remaining slots can add,
+    # a candidate whose achievable calorie window misses target ± 300 (or
+    # that can't reach the protein minimum) provably leads to a dead end
+    min_cal, max_cal, max_prot = bounds
+    remaining = num_meals - len(current_plan) - 1
+    cal_lower = user.calorie_target - 300
+    cal_upper = user.calorie_target + 300
 
     # Try each candidate in order (greedy - best first)
     for recipe in candidates:
-        # Add recipe to current plan
-        new_plan = current_plan + [recipe]
-        new_used_ids = used_ids | {recipe.id}
-
-        # Recursive call to fill next slot
-        result = greedy_csp_planner(
-            recipes=recipes,
-            user=user,
-            num_meals=num_meals,
-            current_plan=new_plan,
-            used_ids=new_used_ids,
-            top_k=top_k
-        )
+        new_cal = state.sum_cal + recipe.calories
+        new_prot = state.sum_prot + recipe.protein
+        if new_cal + remaining * min_cal > cal_upper:
+            continue  # Already too heavy even with the lightest fillers
+        if new_cal + remaining * max_cal < cal_lower:
+            continue  # Can't reach the calorie floor, backtrack early
+        if new_prot + remaining * max_prot < user.protein_min:
+            continue  # Protein minimum is out of reach
+
+        # Recursive call to fill next slot; mutate-then-restore instead of
+        # copying the plan list and used-id set for every candidate tried
+        current_plan.append(recipe)
+        used_ids.add(recipe.id)
+        try:
+            result = _fill_slots(
+                base_domain,
+                user,
+                num_meals,
+                current_plan,
+                used_ids,
+                top_k,
+                state.extended(recipe),
+                bounds
+            )
+        finally:
+            current_plan.pop()
+            used_ids.discard(recipe.id)
 
         if result is not None:
             # Found valid complete plan
@@ -93,6 +169,171 @@ def greedy_csp_planner(recipes, user, num_meals=3, current_plan=None, used_ids=N
     return None
 
 
+def plan_for_users(recipes, users, num_meals=3, top_k=15):
+    """
+    Plan for many users in one call, sharing the slot-1 scoring pass.
+
+    Slot 1 is the widest level of every user's search (no recipes used
+    yet), and with an empty partial plan the heuristic reduces to
+    per-recipe terms plus per-user scalars. Those score as one (U, N)
+    broadcast over the SoA columns, so the recipe arrays stream through
+    memory once for all users instead of once per user. After slot 1 the
+    searches diverge and continue depth-first per user as usual.
+
+    Args:
+        recipes: List of Recipe objects (full recipe database)
+        users: List of User objects
+        num_meals: Number of meals per plan (default: 3)
+        top_k: Beam width for greedy search (default: 15)
+
+    Returns:
+        dict: user.id -> list of Recipe objects, or None where no plan exists
+    """
+    soa = get_recipe_soa()
+    pools = {user.id: get_available(recipes, user) for user in users}
+
+    id_to_index = soa['id_to_index'] if soa is not None else None
+    if id_to_index is None or any(r.id not in id_to_index for r in recipes):
+        # No columnar view for these recipes; plan sequentially
+        return {user.id: greedy_csp_planner(recipes, user, num_meals, top_k=top_k)
+                for user in users}
+
+    # Per-recipe slot-1 terms (identical for every user): with an empty
+    # partial plan there is no overlap and the diversity ratio is zero
+    row_idx = np.asarray([id_to_index[r.id] for r in recipes], dtype=np.int64)
+    cand_cal = soa['calories'][row_idx].astype(np.float64)
+    cand_prot = soa['protein'][row_idx].astype(np.float64)
+    ing_matrix = soa['ingredient_matrix'][row_idx]
+    unique_ings = ing_matrix.sum(axis=1)
+    unique_tags = soa['tag_matrix'][row_idx].sum(axis=1)
+    diversity = np.clip((unique_ings * 2 + unique_tags) * 2, 0, 100)
+
+    # Per-user scalar columns
+    targets = np.asarray([u.calorie_target for u in users], dtype=np.float64)[:, None]
+    protein_mins = np.asarray([u.protein_min for u in users], dtype=np.float64)[:, None]
+
+    # Preference matches as one (U, V) x (V, N) product
+    ing_vocab = soa['ingredient_vocab']
+    pref_mat = np.zeros((len(users), ing_matrix.shape[1]), dtype=np.float32)
+    n_prefs = np.zeros(len(users), dtype=np.float64)
+    for i, user in enumerate(users):
+        n_prefs[i] = len(user.preferences)
+        for pref in user.preferences:
+            col = ing_vocab.get(pref)
+            if col is not None:
+                pref_mat[i, col] = 1.0
+    matches = pref_mat @ ing_matrix.T.astype(np.float32)
+    with np.errstate(invalid='ignore'):
+        preference = np.where(n_prefs[:, None] > 0,
+                              matches / np.where(n_prefs[:, None] > 0, n_prefs[:, None], 1) * 100,
+                              50.0)
+
+    # (U, N) slot-1 scores, mirroring heuristic_from_state on empty state
+    cal_err = np.abs(cand_cal[None, :] - targets)
+    prot_def = np.maximum(0.0, protein_mins - cand_prot[None, :])
+    scores = (cal_err + 2.0 * prot_def +
+              0.6 * (100 - diversity)[None, :] +
+              0.4 * (100 - preference))
+    overshoot = cand_cal[None, :] > targets + 300
+    scores = np.where(overshoot, INFEASIBLE_PENALTY + cal_err, scores)
+
+    # Recipes outside a user's filtered pool are not candidates at all
+    pool_ids = {uid: {r.id for r in pool} for uid, pool in pools.items()}
+    for i, user in enumerate(users):
+        valid = pool_ids[user.id]
+        invalid = np.asarray([r.id not in valid for r in recipes], dtype=bool)
+        scores[i, invalid] = FLOAT_MAX
+
+    plans = {}
+    for i, user in enumerate(users):
+        pool = pools[user.id]
+        if len(pool) < num_meals:
+            plans[user.id] = None
+            continue
+
+        # Row-wise top-k for slot 1 from the shared score matrix
+        row = scores[i]
+        n_valid = len(pool)
+        k = min(top_k, n_valid)
+        part = np.argpartition(row, k - 1)[:k]
+        order = part[np.argsort(row[part])]
+        slot1_candidates = [recipes[j] for j in order]
+
+        bounds = (min(r.calories for r in pool),
+                  max(r.calories for r in pool),
+                  max(r.protein for r in pool))
+        min_cal, max_cal, max_prot = bounds
+        remaining = num_meals - 1
+        cal_lower = user.calorie_target - 300
+        cal_upper = user.calorie_target + 300
+
+        empty = PartialPlanState()
+        plan = None
+        for recipe in slot1_candidates:
+            # Same forward checks _fill_slots applies before recursing
+            if recipe.calories + remaining * min_cal > cal_upper:
+                continue
+            if recipe.calories + remaining * max_cal < cal_lower:
+                continue
+            if recipe.protein + remaining * max_prot < user.protein_min:
+                continue
+            plan = _fill_slots(pool, user, num_meals, [recipe], {recipe.id},
+                               top_k, empty.extended(recipe), bounds)
+            if plan is not None:
+                break
+        plans[user.id] = plan
+
+    return plans
+
+
+# Worker-process state for plan_many, set once per worker by the
+# initializer so tasks only carry the (small) User objects
+_worker_recipes = None
+
+
+def _init_plan_worker(recipes, ingredient_bits, tag_bits, allergen_bits):
+    """Initializer run once in each plan_many worker."""
+    global _worker_recipes
+    _worker_recipes = recipes
+    # Re-seed the token vocabularies for spawn-based platforms (a no-op
+    # under fork, where workers inherit them)
+    data_loader.INGREDIENT_BITS.update(ingredient_bits)
+    data_loader.TAG_BITS.update(tag_bits)
+    data_loader.ALLERGEN_BITS.update(allergen_bits)
+
+
+def _plan_one(user, num_meals, top_k):
+    """Plan for a single user inside a worker process."""
+    return greedy_csp_planner(_worker_recipes, user, num_meals, top_k=top_k)
+
+
+def plan_many(recipes, users, num_meals=3, top_k=15, workers=None):
+    """
+    Plan for many users in parallel across worker processes.
+
+    Each user's CSP search is independent, so the per-user loop forks out
+    to a process pool. Recipes are shipped to each worker once through
+    the initializer rather than pickled per task.
+
+    Args:
+        recipes: List of Recipe objects (full recipe database)
+        users: List of User objects
+        num_meals: Number of meals per plan (default: 3)
+        top_k: Beam width for greedy search (default: 15)
+        workers: Worker process count (default: os.cpu_count())
+
+    Returns:
+        dict: user.id -> list of Recipe objects, or None where no plan exists
+    """
+    with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_plan_worker,
+            initargs=(recipes, data_loader.INGREDIENT_BITS,
+                      data_loader.TAG_BITS, data_loader.ALLERGEN_BITS)) as executor:
+        futures = [executor.submit(_plan_one, user, num_meals, top_k) for user in users]
+        return {user.id: future.result() for user, future in zip(users, futures)}
+
+
 def csp_planner_with_config(recipes, user, num_meals=3, top_k=15):
     """
     Wrapper function for CSP planner with configurable parameters.
@@ -153,7 +394,7 @@ if __name__ == '__main__':
         print(f"  Preferences: {alex.preferences}")
 
         # Step 1: Show filtering
-        available = filter_by_diet_and_allergens(recipes, alex)
+        available = get_available(recipes, alex)
         print(f"\nStep 1: Filter recipes")
         print(f"  Total recipes: {len(recipes)}")
         print(f"  After diet & allergen filtering: {len(available)}")
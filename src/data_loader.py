@@ -4,13 +4,84 @@ Handles loading recipes and users, converting strings to sets for efficient proc
 """
 
 import pandas as pd
+import numpy as np
 import json
+import os
+import pickle
 from pathlib import Path
 
 
+# Global token -> bit-position vocabularies, grown as recipes are loaded.
+# Each ingredient/tag gets one bit, so a recipe's ingredients or tags can be
+# packed into a single Python int and compared with bitwise ops instead of
+# set intersections.
+INGREDIENT_BITS = {}
+TAG_BITS = {}
+
+# Allergen token -> bit position, grown as users (and their allergen
+# lists) are seen. Recipes match allergens by substring against their
+# ingredients, so recipe-side masks are extended lazily whenever the
+# vocabulary has grown since the recipe last checked.
+ALLERGEN_BITS = {}
+
+# Structure-of-Arrays view of the most recently loaded recipe list,
+# rebuilt by load_recipes and shared by metrics/planners for vectorized
+# reductions. None until recipes are loaded.
+RECIPE_SOA = None
+
+# recipe.id -> Recipe for the most recent load_recipes call. Mutated in
+# place (not rebound) so `from data_loader import RECIPES_BY_ID` stays
+# valid across reloads.
+RECIPES_BY_ID = {}
+
+# recipe.signature -> list of Recipes sharing it, for the most recent
+# load. When every signature is unique the heuristic dedup path stays
+# disabled.
+SIGNATURE_GROUPS = {}
+
+
+def get_recipe_soa():
+    """Return the SoA view built for the last load_recipes call (or None)."""
+    return RECIPE_SOA
+
+
+def _intern_mask(tokens, vocab):
+    """Assign bits for unseen tokens and return the OR of all token bits."""
+    mask = 0
+    for token in tokens:
+        bit = vocab.get(token)
+        if bit is None:
+            bit = len(vocab)
+            vocab[token] = bit
+        mask |= 1 << bit
+    return mask
+
+
+def tokens_to_mask(tokens, vocab):
+    """
+    Build a bitmask for tokens already present in a vocabulary.
+
+    Unknown tokens are skipped (they cannot match any recipe anyway), so
+    the vocabulary is not grown by user input.
+    """
+    mask = 0
+    for token in tokens:
+        bit = vocab.get(token)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
 class Recipe:
     """Represents a single recipe with nutritional information and metadata."""
 
+    # Fixed attribute layout: no per-instance __dict__, which shrinks each
+    # Recipe and keeps attribute-heavy scans cache-friendly
+    __slots__ = ('id', 'name', 'calories', 'protein', 'carbs', 'fat',
+                 'ingredients', 'tags', 'ingredient_mask', 'tag_mask',
+                 'ingredient_count', 'display_ingredients', 'signature',
+                 '_allergen_mask', '_allergen_bits_seen')
+
     def __init__(self, recipe_id, name, calories, protein, carbs, fat, ingredients, tags):
         self.id = recipe_id
         self.name = name
@@ -18,17 +89,52 @@ class Recipe:
         self.protein = float(protein)
         self.carbs = float(carbs)
         self.fat = float(fat)
-        # Convert comma-separated string to set of lowercase ingredients
-        self.ingredients = set(ing.strip().lower() for ing in ingredients.split(','))
-        # Convert comma-separated string to set of lowercase tags
-        self.tags = set(tag.strip().lower() for tag in tags.split(','))
+        # One C-level lowercase over the whole string, then split; frozenset
+        # keeps the collections hashable and read-only
+        self.ingredients = frozenset(ing.strip() for ing in ingredients.lower().split(','))
+        self.tags = frozenset(tag.strip() for tag in tags.lower().split(','))
+        # Packed bitmask forms for single-instruction overlap/membership tests
+        self.ingredient_mask = _intern_mask(self.ingredients, INGREDIENT_BITS)
+        self.tag_mask = _intern_mask(self.tags, TAG_BITS)
+        # Cached once so hot scoring loops never re-measure the set
+        self.ingredient_count = len(self.ingredients)
+        # Recipes sharing this signature are indistinguishable to the
+        # greedy heuristic, so the selector can score one representative
+        # per group (exact values, not rounded, so grouping is lossless)
+        self.signature = (self.calories, self.protein,
+                          self.ingredient_mask, self.tag_mask)
+        # Allergen mask is built lazily (see allergen_mask property) since
+        # the allergen vocabulary grows as users are loaded
+        self._allergen_mask = 0
+        self._allergen_bits_seen = 0
+        # Stable short ingredient list for UI display, built once instead of
+        # copy-then-slice on every request
+        self.display_ingredients = tuple(sorted(self.ingredients))[:8]
 
     def __repr__(self):
         return f"Recipe({self.id}, {self.name}, {self.calories}cal, {self.protein}g protein)"
 
+    @property
+    def allergen_mask(self):
+        """
+        Bitmask of vocabulary allergens this recipe contains.
+
+        The substring scan over ingredients runs once per (recipe,
+        allergen) pair for the whole process; afterwards allergen checks
+        are a single bitwise AND against a user's allergen_mask.
+        """
+        n = len(ALLERGEN_BITS)
+        if self._allergen_bits_seen < n:
+            for allergen, bit in ALLERGEN_BITS.items():
+                if bit >= self._allergen_bits_seen and self.contains_allergen(allergen):
+                    self._allergen_mask |= 1 << bit
+            self._allergen_bits_seen = n
+        return self._allergen_mask
+
     def has_tag(self, tag):
         """Check if recipe has a specific dietary tag."""
-        return tag.lower() in self.tags
+        bit = TAG_BITS.get(tag.lower())
+        return bit is not None and (self.tag_mask >> bit) & 1 == 1
 
     def contains_allergen(self, allergen):
         """Check if recipe contains an allergen (case-insensitive partial matching)."""
@@ -42,25 +148,113 @@ class Recipe:
 class User:
     """Represents a user with dietary constraints and preferences."""
 
+    __slots__ = ('id', 'name', 'diet_type', 'calorie_target', 'protein_min',
+                 'allergens', 'preferences', 'preference_mask', 'allergen_mask')
+
     def __init__(self, user_id, name, diet_type, calorie_target, protein_min, allergens, preferences):
         self.id = user_id
         self.name = name
         self.diet_type = diet_type.lower()
         self.calorie_target = float(calorie_target)
         self.protein_min = float(protein_min)
-        # Convert allergens to lowercase set
-        self.allergens = set(allergen.lower() for allergen in allergens)
-        # Convert preferences to lowercase set
-        self.preferences = set(pref.lower() for pref in preferences)
+        # Lowercased frozensets, matching the recipe collections: hashable
+        # (metric cache signatures use them directly) and O(1) membership
+        self.allergens = frozenset(allergen.lower() for allergen in allergens)
+        self.preferences = frozenset(pref.lower() for pref in preferences)
+        # Bitmask over the ingredient vocabulary (recipes must be loaded
+        # first so the vocabulary is populated; true for all entry points)
+        self.preference_mask = tokens_to_mask(self.preferences, INGREDIENT_BITS)
+        # Allergens intern into the shared vocabulary so recipe masks can
+        # be compared with a single AND
+        self.allergen_mask = _intern_mask(self.allergens, ALLERGEN_BITS)
 
     def __repr__(self):
         return f"User({self.name}, {self.diet_type}, {self.calorie_target}cal, {self.protein_min}g protein)"
 
 
+# SoA entries persisted as NPZ arrays by the on-disk load cache; the
+# remaining (non-array) entries travel in the pickle side file
+_SOA_ARRAY_KEYS = ('calories', 'protein', 'carbs', 'fat', 'nutrients',
+                   'tag_matrix', 'ingredient_matrix', 'ing_mask_lo',
+                   'ing_mask_hi', 'tag_mask_lo', 'ingredient_counts')
+
+
+def _cache_paths(filepath):
+    """NPZ + pickle cache paths stored alongside the recipe CSV."""
+    parent = Path(filepath).parent
+    return parent / '.recipes_cache.npz', parent / '.recipes_meta.pkl'
+
+
+def _load_recipe_cache(filepath, sig):
+    """
+    Load recipes + SoA from the on-disk cache, or None on any miss.
+
+    A stale signature, missing file, or unreadable payload all count as
+    misses — the caller falls back to parsing the CSV.
+    """
+    npz_path, pkl_path = _cache_paths(filepath)
+    try:
+        with open(pkl_path, 'rb') as f:
+            meta = pickle.load(f)
+        if meta['sig'] != sig:
+            return None
+        with np.load(npz_path) as data:
+            arrays = {key: data[key] for key in _SOA_ARRAY_KEYS}
+    except (OSError, KeyError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+
+    # Restore the vocabularies the pickled masks were built against
+    INGREDIENT_BITS.clear()
+    INGREDIENT_BITS.update(meta['ingredient_bits'])
+    TAG_BITS.clear()
+    TAG_BITS.update(meta['tag_bits'])
+
+    recipes = meta['recipes']
+    # Allergen masks depend on ALLERGEN_BITS, which grows as users load
+    # in this process — discard any lazily built state from cache time
+    for recipe in recipes:
+        recipe._allergen_mask = 0
+        recipe._allergen_bits_seen = 0
+
+    soa = dict(arrays)
+    soa.update(meta['soa_meta'])
+    return recipes, soa
+
+
+def _write_recipe_cache(filepath, sig, recipes, soa):
+    """Atomically persist recipes + SoA next to the CSV (best effort)."""
+    npz_path, pkl_path = _cache_paths(filepath)
+    meta = {
+        'sig': sig,
+        'ingredient_bits': dict(INGREDIENT_BITS),
+        'tag_bits': dict(TAG_BITS),
+        'recipes': recipes,
+        'soa_meta': {key: soa[key] for key in
+                     ('mask_lanes_ok', 'tag_vocab', 'ingredient_vocab', 'id_to_index')},
+    }
+    try:
+        # Write to temp files first so a crash never leaves a torn cache
+        # (the temp names keep the .npz/.pkl endings np.savez expects)
+        npz_tmp = npz_path.with_name('.recipes_cache.tmp.npz')
+        pkl_tmp = pkl_path.with_name('.recipes_meta.tmp.pkl')
+        np.savez(npz_tmp, **{key: soa[key] for key in _SOA_ARRAY_KEYS})
+        with open(pkl_tmp, 'wb') as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(npz_tmp, npz_path)
+        os.replace(pkl_tmp, pkl_path)
+    except OSError:
+        pass
+
+
 def load_recipes(filepath='data/recipes.csv'):
     """
     Load recipes from CSV file and convert to Recipe objects.
 
+    When MEALPLAN_CACHE=1 is set, the derived state (Recipe objects,
+    token vocabularies, SoA arrays) is persisted next to the CSV and
+    reloaded on later runs, keyed by the CSV's mtime + size, skipping
+    the parse and mask construction entirely on a hit.
+
     Args:
         filepath: Path to recipes CSV file
 
@@ -72,25 +266,150 @@ def load_recipes(filepath='data/recipes.csv'):
         # Try relative to project root
         filepath = Path(__file__).parent.parent / filepath
 
+    use_cache = os.environ.get('MEALPLAN_CACHE') == '1'
+    if use_cache:
+        sig = (os.path.getmtime(filepath), os.path.getsize(filepath))
+        cached = _load_recipe_cache(filepath, sig)
+        if cached is not None:
+            recipes, soa = cached
+            _finalize_load(recipes, soa)
+            return recipes
+
     df = pd.read_csv(filepath)
 
-    recipes = []
-    for _, row in df.iterrows():
-        recipe = Recipe(
-            recipe_id=row['id'],
-            name=row['name'],
-            calories=row['calories'],
-            protein=row['protein'],
-            carbs=row['carbs'],
-            fat=row['fat'],
-            ingredients=row['ingredients'],
-            tags=row['tags']
+    # Pull each column out once as a NumPy array; iterrows would box every
+    # row into a throwaway Series
+    ids, names, cals, prots, carbs, fats, ings, tags = (
+        df[col].to_numpy()
+        for col in ['id', 'name', 'calories', 'protein', 'carbs', 'fat', 'ingredients', 'tags']
+    )
+
+    recipes = [
+        Recipe(
+            recipe_id=ids[i],
+            name=names[i],
+            calories=cals[i],
+            protein=prots[i],
+            carbs=carbs[i],
+            fat=fats[i],
+            ingredients=ings[i],
+            tags=tags[i]
         )
-        recipes.append(recipe)
+        for i in range(len(df))
+    ]
+
+    soa = build_recipe_soa(recipes)
+    if use_cache:
+        _write_recipe_cache(filepath, sig, recipes, soa)
+    _finalize_load(recipes, soa)
 
     return recipes
 
 
+def _finalize_load(recipes, soa):
+    """Install a loaded recipe list into the module-level lookup state."""
+    # Keep the columnar view and id lookup in sync with the loaded list
+    global RECIPE_SOA
+    RECIPE_SOA = soa
+    RECIPES_BY_ID.clear()
+    RECIPES_BY_ID.update((recipe.id, recipe) for recipe in recipes)
+    SIGNATURE_GROUPS.clear()
+    for recipe in recipes:
+        SIGNATURE_GROUPS.setdefault(recipe.signature, []).append(recipe)
+
+    # Rebuild the diet-type buckets for this list (imported here because
+    # constraints imports this module at top level)
+    from constraints import rebuild_indexes
+    rebuild_indexes(recipes)
+
+    # Drop memoized scores keyed by recipe id: after loading a different
+    # CSV the same ids can name different recipes, and the lru entries
+    # would silently serve the previous dataset's results (same reasoning
+    # as the allergen-mask reset on the cache-restore path). Imported
+    # lazily for the same cycle reason as constraints above.
+    from heuristics import clear_cache
+    from metrics import clear_metric_caches
+    clear_cache()
+    clear_metric_caches()
+
+
+def build_recipe_soa(recipes):
+    """
+    Build a Structure-of-Arrays view of the recipe list for vectorized math.
+
+    The Recipe objects stay the source of truth for names/sets; the SoA
+    holds parallel NumPy columns so hot loops (totals, scoring) can run as
+    array reductions instead of per-object attribute walks.
+
+    Args:
+        recipes: List of Recipe objects
+
+    Returns:
+        dict with:
+            'calories', 'protein', 'carbs', 'fat': float32 arrays (N,)
+            'nutrients': the same four columns stacked as one (N, 4)
+                float32 matrix, so plan totals are a single reduction
+            'tag_matrix': bool array (N, n_tags)
+            'ingredient_matrix': bool array (N, n_ingredients)
+            'ing_mask_lo', 'ing_mask_hi': uint64 ingredient-mask lanes (N,)
+            'tag_mask_lo': uint64 tag masks (N,)
+            'ingredient_counts': float32 ingredient counts (N,)
+            'mask_lanes_ok': bool, True when all masks fit the uint64 lanes
+            'tag_vocab': dict mapping tag -> column index
+            'ingredient_vocab': dict mapping ingredient -> column index
+            'id_to_index': dict mapping recipe.id -> row index
+    """
+    n = len(recipes)
+
+    # Nutrient columns
+    calories = np.asarray([r.calories for r in recipes], dtype=np.float32)
+    protein = np.asarray([r.protein for r in recipes], dtype=np.float32)
+    carbs = np.asarray([r.carbs for r in recipes], dtype=np.float32)
+    fat = np.asarray([r.fat for r in recipes], dtype=np.float32)
+
+    # Build vocabularies over all tags and ingredients
+    tag_vocab = {tag: i for i, tag in enumerate(sorted(set().union(*(r.tags for r in recipes))))} if n else {}
+    ingredient_vocab = {ing: i for i, ing in enumerate(sorted(set().union(*(r.ingredients for r in recipes))))} if n else {}
+
+    # Packed uint64 lanes of the per-recipe bitmasks for the JIT scoring
+    # kernel (lo = bits 0-63, hi = bits 64-127). mask_lanes_ok records
+    # whether every mask fits in the two-lane layout.
+    u64 = (1 << 64) - 1
+    mask_lanes_ok = all(r.ingredient_mask < (1 << 128) and r.tag_mask < (1 << 64)
+                        for r in recipes)
+    ing_mask_lo = np.asarray([r.ingredient_mask & u64 for r in recipes], dtype=np.uint64)
+    ing_mask_hi = np.asarray([(r.ingredient_mask >> 64) & u64 for r in recipes], dtype=np.uint64)
+    tag_mask_lo = np.asarray([r.tag_mask & u64 for r in recipes], dtype=np.uint64)
+    ingredient_counts = np.asarray([r.ingredient_count for r in recipes], dtype=np.float32)
+
+    # Boolean membership matrices (small enough to keep dense)
+    tag_matrix = np.zeros((n, len(tag_vocab)), dtype=bool)
+    ingredient_matrix = np.zeros((n, len(ingredient_vocab)), dtype=bool)
+    for i, recipe in enumerate(recipes):
+        for tag in recipe.tags:
+            tag_matrix[i, tag_vocab[tag]] = True
+        for ing in recipe.ingredients:
+            ingredient_matrix[i, ingredient_vocab[ing]] = True
+
+    return {
+        'calories': calories,
+        'protein': protein,
+        'carbs': carbs,
+        'fat': fat,
+        'nutrients': np.stack([calories, protein, carbs, fat], axis=1),
+        'tag_matrix': tag_matrix,
+        'ingredient_matrix': ingredient_matrix,
+        'ing_mask_lo': ing_mask_lo,
+        'ing_mask_hi': ing_mask_hi,
+        'tag_mask_lo': tag_mask_lo,
+        'ingredient_counts': ingredient_counts,
+        'mask_lanes_ok': mask_lanes_ok,
+        'tag_vocab': tag_vocab,
+        'ingredient_vocab': ingredient_vocab,
+        'id_to_index': {r.id: i for i, r in enumerate(recipes)},
+    }
+
+
 def load_users(filepath='data/test_users.json'):
     """
     Load test users from JSON file and convert to User objects.
@@ -6,7 +6,47 @@ Algorithm: Tests all valid combinations and selects the best using optimal scori
 """
 
 from itertools import combinations
-from constraints import filter_by_diet_and_allergens, violates_hard_constraints
+from operator import attrgetter
+
+import numpy as np
+
+from constraints import get_available
+from data_loader import get_recipe_soa
+
+_U64 = (1 << 64) - 1
+
+# map(attrgetter, plan) keeps object-fallback sums in the C layer instead
+# of resuming a generator frame per recipe
+_get_calories = attrgetter('calories')
+_get_protein = attrgetter('protein')
+
+if hasattr(np, 'bitwise_count'):
+    _popcount_u64 = np.bitwise_count
+else:
+    def _popcount_u64(arr):
+        """Per-element popcount for uint64 arrays (NumPy < 2.0)."""
+        return np.unpackbits(arr.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _plan_nutrient_totals(plan):
+    """
+    Total calories and protein for a plan, via SoA columns when available.
+
+    Falls back to summing Recipe attributes for plans built outside
+    load_recipes (no SoA row to index).
+    """
+    soa = get_recipe_soa()
+    if soa is not None:
+        id_to_index = soa['id_to_index']
+        try:
+            plan_idx = [id_to_index[recipe.id] for recipe in plan]
+        except KeyError:
+            pass
+        else:
+            return (float(soa['calories'][plan_idx].sum(dtype=np.float64)),
+                    float(soa['protein'][plan_idx].sum(dtype=np.float64)))
+    return (sum(map(_get_calories, plan)),
+            sum(map(_get_protein, plan)))
 
 
 def oracle_scoring_function(plan, user):
@@ -27,25 +67,28 @@ def oracle_scoring_function(plan, user):
     Returns:
         float: Quality score (lower is better)
     """
-    # Calorie error (squared for precision)
-    total_calories = sum(recipe.calories for recipe in plan)
-    calorie_error = (total_calories - user.calorie_target) ** 2
+    total_calories, total_protein = _plan_nutrient_totals(plan)
+
+    # Calorie error (squared for precision; d*d skips the generic pow
+    # dispatch, and squaring already drops the sign)
+    calorie_diff = total_calories - user.calorie_target
+    calorie_error = calorie_diff * calorie_diff
 
     # Protein (prefer meeting requirement with slight surplus)
-    total_protein = sum(recipe.protein for recipe in plan)
-    protein_score = abs(total_protein - user.protein_min - 10) ** 2  # Target: min + 10g buffer
+    protein_diff = total_protein - user.protein_min - 10  # Target: min + 10g buffer
+    protein_score = protein_diff * protein_diff
 
-    # Diversity: count unique ingredients
-    all_ingredients = set()
+    # Union the packed ingredient bitmasks once; unique-ingredient and
+    # preference counts are then popcounts instead of set allocations
+    plan_mask = 0
     for recipe in plan:
-        all_ingredients.update(recipe.ingredients)
-    diversity_penalty = -len(all_ingredients) * 5  # Negative = reward
+        plan_mask |= recipe.ingredient_mask
+
+    # Diversity: count unique ingredients
+    diversity_penalty = -plan_mask.bit_count() * 5  # Negative = reward
 
     # Preference matching
-    plan_ingredients = set()
-    for recipe in plan:
-        plan_ingredients.update(recipe.ingredients)
-    preferences_matched = len(user.preferences & plan_ingredients)
+    preferences_matched = (plan_mask & user.preference_mask).bit_count()
     preference_penalty = -preferences_matched * 20  # Negative = reward
 
     # Combined score (lower is better)
@@ -57,7 +100,242 @@ def oracle_scoring_function(plan, user):
     return score
 
 
-def oracle_planner(recipes, user, num_meals=3, max_combinations=50000):
+def _feasible_combination_rows(pool_cal, pool_prot, user, num_meals, node_budget):
+    """
+    Branch-and-bound enumeration of hard-constraint-feasible combinations.
+
+    The pool must be sorted by calories ascending. At each depth the
+    prefix sums give the exact min/max achievable calorie total for the
+    remaining slots, so whole subtrees that cannot land in the calorie
+    window are skipped; a suffix max over protein prunes branches that
+    can no longer reach the protein minimum. Only feasible complete
+    combinations are emitted, so for tight calorie windows this visits a
+    small fraction of C(n, num_meals).
+
+    Every feasible combination is collected — truncating the feasible
+    set would bias the oracle toward the low-calorie corner of the
+    sorted pool. node_budget caps the candidates *examined* and exists
+    purely as a safety valve for pathologically large pools; it should
+    never bind on realistic data.
+
+    Args:
+        pool_cal, pool_prot: float64 nutrient arrays, calorie-sorted
+        user: User object
+        num_meals: Number of meals to select
+        node_budget: Cap on search-tree nodes examined (safety valve)
+
+    Returns:
+        (rows, num_meals) int32 index matrix into the sorted pool
+    """
+    if num_meals == 3:
+        return _feasible_rows_k3(pool_cal, pool_prot, user, node_budget)
+
+    n = pool_cal.size
+    cal_lower = user.calorie_target - 300.0
+    cal_upper = user.calorie_target + 300.0
+    protein_min = user.protein_min
+    prefix = np.concatenate(([0.0], np.cumsum(pool_cal)))
+    # suffix_max_prot[i] = max protein over pool[i:]
+    suffix_max_prot = np.maximum.accumulate(pool_prot[::-1])[::-1]
+
+    # Flat index buffer (num_meals entries per combination): extending a
+    # scalar list and reshaping one np.fromiter with a known count skips
+    # per-combination tuple boxing and np.array's nested traversal
+    flat = []
+    chosen = [0] * num_meals
+    nodes = 0
+    out_of_budget = False
+
+    def recurse(depth, start, cal_acc, prot_acc):
+        nonlocal nodes, out_of_budget
+        rest = num_meals - depth - 1
+        for i in range(start, n - rest):
+            nodes += 1
+            if nodes > node_budget:
+                out_of_budget = True
+                return
+            new_cal = cal_acc + pool_cal[i]
+            # Exact calorie bounds over the remaining slots: the rest
+            # smallest candidates follow i directly (sorted), the rest
+            # largest sit at the end of the pool
+            if new_cal + (prefix[i + 1 + rest] - prefix[i + 1]) > cal_upper:
+                break  # later i only grows the minimum total
+            if new_cal + (prefix[n] - prefix[n - rest]) < cal_lower:
+                continue
+            if prot_acc + (rest + 1) * suffix_max_prot[i] < protein_min:
+                break  # protein ceiling only shrinks for later i
+            if rest:
+                chosen[depth] = i
+                recurse(depth + 1, i + 1, new_cal, prot_acc + pool_prot[i])
+                if out_of_budget:
+                    return
+            else:
+                if new_cal < cal_lower or prot_acc + pool_prot[i] < protein_min:
+                    continue
+                chosen[depth] = i
+                flat.extend(chosen)
+
+    recurse(0, 0, 0.0, 0.0)
+    return np.fromiter(flat, dtype=np.int32,
+                       count=len(flat)).reshape(-1, num_meals)
+
+
+def _feasible_rows_k3(pool_cal, pool_prot, user, node_budget):
+    """
+    Unrolled num_meals=3 form of _feasible_combination_rows.
+
+    Every caller uses three meals, so the recursion is flattened into
+    three nested loops over plain Python lists (scalar indexing on lists
+    is much cheaper than on NumPy arrays) with the same monotone
+    calorie/protein cuts at each level. Emits every feasible row, in the
+    identical lexicographic order as the generic enumerator; node_budget
+    only guards against pathologically large pools (counted per
+    surviving (i, j) pair as the worst-case size of its k loop).
+    """
+    n = len(pool_cal)
+    cal_lower = user.calorie_target - 300.0
+    cal_upper = user.calorie_target + 300.0
+    protein_min = user.protein_min
+
+    cal = pool_cal.tolist()
+    prot = pool_prot.tolist()
+    prefix = [0.0]
+    acc = 0.0
+    for c in cal:
+        acc += c
+        prefix.append(acc)
+    # suffix_max_prot[i] = max protein over pool[i:]
+    suffix_max_prot = np.maximum.accumulate(pool_prot[::-1])[::-1].tolist()
+
+    # Largest one/two-recipe calorie sums available anywhere in the pool
+    max1 = prefix[n] - prefix[n - 1] if n >= 1 else 0.0
+    max2 = prefix[n] - prefix[n - 2] if n >= 2 else 0.0
+
+    flat = []
+    nodes = 0
+
+    for i in range(n - 2):
+        cal_i = cal[i]
+        if cal_i + (prefix[i + 3] - prefix[i + 1]) > cal_upper:
+            break
+        if cal_i + max2 < cal_lower:
+            continue
+        if 3 * suffix_max_prot[i] < protein_min:
+            break
+        prot_i = prot[i]
+        for j in range(i + 1, n - 1):
+            cal_ij = cal_i + cal[j]
+            if cal_ij + cal[j + 1] > cal_upper:
+                break
+            if cal_ij + max1 < cal_lower:
+                continue
+            if prot_i + 2 * suffix_max_prot[j] < protein_min:
+                break
+            nodes += n - j - 1
+            if nodes > node_budget:
+                return np.fromiter(flat, dtype=np.int32,
+                                   count=len(flat)).reshape(-1, 3)
+            prot_ij = prot_i + prot[j]
+            for k in range(j + 1, n):
+                total_cal = cal_ij + cal[k]
+                if total_cal > cal_upper:
+                    break
+                if total_cal < cal_lower or prot_ij + prot[k] < protein_min:
+                    continue
+                flat.append(i)
+                flat.append(j)
+                flat.append(k)
+
+    return np.fromiter(flat, dtype=np.int32, count=len(flat)).reshape(-1, 3)
+
+
+def _oracle_batched(available, pool_idx, soa, user, num_meals, node_budget):
+    """
+    Score the feasible combinations of the pool in batched NumPy reductions.
+
+    The pool is sorted by calories so the branch-and-bound enumerator
+    can skip whole infeasible subtrees; every surviving row of the
+    (rows, num_meals) index matrix is then scored with array ops and the
+    argmin taken. Scores match evaluating oracle_scoring_function per
+    combination, so the result is the true optimum whenever the node
+    budget does not bind.
+
+    Args:
+        available: Filtered list of Recipe objects
+        pool_idx: SoA row index for each recipe in available
+        soa: Structure-of-Arrays dict from get_recipe_soa()
+        user: User object
+        num_meals: Number of meals to select
+        node_budget: Cap on enumeration nodes examined (safety valve)
+
+    Returns:
+        List of Recipe objects (best meal plan) or None if no solution found
+    """
+    pool_cal_raw = soa['calories'][pool_idx].astype(np.float64)
+    order = np.argsort(pool_cal_raw, kind='stable')
+    available = [available[i] for i in order]
+    pool_idx = pool_idx[order]
+    pool_cal = pool_cal_raw[order]
+    pool_prot = soa['protein'][pool_idx].astype(np.float64)
+
+    idx_mat = _feasible_combination_rows(pool_cal, pool_prot, user,
+                                         num_meals, node_budget)
+    if idx_mat.shape[0] == 0:
+        return None
+
+    cal_sums = pool_cal[idx_mat].sum(axis=1)
+    prot_sums = pool_prot[idx_mat].sum(axis=1)
+    cal_diff = cal_sums - user.calorie_target
+    calorie_error = cal_diff * cal_diff
+    prot_diff = prot_sums - user.protein_min - 10
+    protein_score = prot_diff * prot_diff
+
+    if soa['mask_lanes_ok']:
+        # Diversity and preference terms over the packed uint64 mask
+        # lanes: one OR-reduce per lane then per-element popcounts
+        plan_lo = np.bitwise_or.reduce(soa['ing_mask_lo'][pool_idx][idx_mat], axis=1)
+        plan_hi = np.bitwise_or.reduce(soa['ing_mask_hi'][pool_idx][idx_mat], axis=1)
+        unique_counts = _popcount_u64(plan_lo) + _popcount_u64(plan_hi)
+        pref_lo = np.uint64(user.preference_mask & _U64)
+        pref_hi = np.uint64((user.preference_mask >> 64) & _U64)
+        matched_counts = (_popcount_u64(plan_lo & pref_lo) +
+                          _popcount_u64(plan_hi & pref_hi))
+        unique_counts = unique_counts.astype(np.float64)
+        matched_counts = matched_counts.astype(np.float64)
+    else:
+        # Vocabulary too wide for the two-lane layout: fall back to the
+        # boolean ingredient matrix, chunked so the
+        # (rows, num_meals, n_ingredients) intermediate stays cache-sized
+        ing_mat = soa['ingredient_matrix'][pool_idx]
+        pref_vec = np.zeros(ing_mat.shape[1], dtype=bool)
+        vocab = soa['ingredient_vocab']
+        for pref in user.preferences:
+            col = vocab.get(pref)
+            if col is not None:
+                pref_vec[col] = True
+
+        n_rows = idx_mat.shape[0]
+        unique_counts = np.empty(n_rows, dtype=np.float64)
+        matched_counts = np.empty(n_rows, dtype=np.float64)
+        chunk = 65536
+        for start in range(0, n_rows, chunk):
+            rows = idx_mat[start:start + chunk]
+            plan_any = ing_mat[rows].any(axis=1)
+            unique_counts[start:start + chunk] = plan_any.sum(axis=1)
+            matched_counts[start:start + chunk] = (plan_any & pref_vec).sum(axis=1)
+
+    scores = (calorie_error * 0.1 +
+              protein_score * 0.2 -
+              unique_counts * 5 -
+              matched_counts * 20)
+
+    # argmin keeps the first minimum, matching the scalar loop's strict
+    # score < best_score update order
+    best = idx_mat[np.argmin(scores)]
+    return [available[i] for i in best]
+
+
+def oracle_planner(recipes, user, num_meals=3, max_combinations=2_000_000):
     """
     Oracle algorithm: Exhaustive search with optimal scoring.
 
@@ -68,36 +346,70 @@ def oracle_planner(recipes, user, num_meals=3, max_combinations=50000):
     4. Score all valid plans using optimal function
     5. Return best plan
 
-    WARNING: Computationally expensive for large recipe sets.
-    Limited to max_combinations to prevent excessive runtime.
+    max_combinations budgets the combinations *examined*, not the valid
+    plans kept: the oracle is the experiments' quality reference, so it
+    scores every feasible plan it finds and the budget exists only to
+    bound runtime on recipe sets far larger than the shipped database.
+    The default covers C(200, 3) with room to spare, making the search
+    exhaustive here; if the budget ever binds, the result is
+    best-of-what-was-examined rather than the true optimum.
 
     Args:
         recipes: List of Recipe objects
         user: User object
         num_meals: Number of meals to select (default: 3)
-        max_combinations: Maximum combinations to evaluate (default: 50000)
+        max_combinations: Budget on combinations examined (default: 2M)
 
     Returns:
         List of Recipe objects (best meal plan) or None if no solution found
     """
     # Pre-filter by diet and allergens
-    available = filter_by_diet_and_allergens(recipes, user)
+    available = get_available(recipes, user)
 
     if len(available) < num_meals:
         return None
 
-    # Generate all possible combinations
+    # Batched NumPy path when every pool recipe has an SoA row
+    soa = get_recipe_soa()
+    if soa is not None:
+        id_to_index = soa['id_to_index']
+        try:
+            pool_idx = np.fromiter((id_to_index[recipe.id] for recipe in available),
+                                   dtype=np.int64, count=len(available))
+        except KeyError:
+            pass
+        else:
+            return _oracle_batched(available, pool_idx, soa, user,
+                                   num_meals, max_combinations)
+
+    # Scalar fallback: generate and evaluate combinations one at a time
     all_combinations = combinations(available, num_meals)
 
     best_plan = None
     best_score = float('inf')
     evaluated = 0
 
+    # Hard-constraint thresholds hoisted out of the loop; the per-combo
+    # check is then two comparisons on single-pass totals instead of a
+    # violates_hard_constraints call that re-sums the plan per constraint
+    cal_lower = user.calorie_target - 300
+    cal_upper = user.calorie_target + 300
+
+    # combinations() yields tuples and nothing downstream mutates the
+    # plan, so they are scored as-is; only the winner becomes a list
     for plan in all_combinations:
-        plan = list(plan)
+        # The budget counts combinations examined (valid or not) so a
+        # binding budget truncates uniformly instead of keeping only the
+        # valid plans that happen to enumerate first
+        evaluated += 1
+        if evaluated > max_combinations:
+            break
 
         # Check hard constraints
-        if violates_hard_constraints(plan, user):
+        total_calories = sum(map(_get_calories, plan))
+        if not cal_lower <= total_calories <= cal_upper:
+            continue
+        if sum(map(_get_protein, plan)) < user.protein_min:
             continue
 
         # Score this valid plan
@@ -107,13 +419,7 @@ def oracle_planner(recipes, user, num_meals=3, max_combinations=50000):
             best_score = score
             best_plan = plan
 
-        evaluated += 1
-
-        # Limit evaluation for performance
-        if evaluated >= max_combinations:
-            break
-
-    return best_plan
+    return list(best_plan) if best_plan is not None else None
 
 
 if __name__ == '__main__':
@@ -133,7 +439,7 @@ if __name__ == '__main__':
         print(f"\nUser: {user.name} ({user.diet_type}, {user.calorie_target}cal, {user.protein_min}g protein)")
 
         start_time = time.time()
-        plan = oracle_planner(recipes, user, max_combinations=10000)  # Limited for testing
+        plan = oracle_planner(recipes, user)
         end_time = time.time()
 
         runtime_ms = (end_time - start_time) * 1000
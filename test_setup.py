@@ -149,42 +149,75 @@ def test_csp():
         return False
 
 
-def test_all_algorithms():
+def _timed_planner(planner, *args, **kwargs):
+    """Run a planner and return (plan, elapsed_ms); picklable for workers."""
+    import time
+    start = time.perf_counter()
+    plan = planner(*args, **kwargs)
+    return plan, (time.perf_counter() - start) * 1000
+
+
+def _init_algo_worker(ingredient_bits, tag_bits, allergen_bits):
+    """
+    Re-seed the token vocabularies in each worker process.
+
+    Diet and allergen checks resolve masks through these data_loader
+    globals; spawn-based platforms start workers with empty dicts (a
+    no-op under fork, where they are inherited).
+    """
+    import data_loader
+    data_loader.INGREDIENT_BITS.update(ingredient_bits)
+    data_loader.TAG_BITS.update(tag_bits)
+    data_loader.ALLERGEN_BITS.update(allergen_bits)
+
+
+def test_all_algorithms(sequential=False):
     """Test all three algorithms."""
     print("\n" + "=" * 60)
     print("TEST 5: All Algorithms Comparison")
     print("=" * 60)
 
     try:
+        from concurrent.futures import ProcessPoolExecutor
+
         from data_loader import load_recipes, load_users
         from baseline import random_baseline_planner
         from oracle import oracle_planner
         from csp_planner import greedy_csp_planner
-        import time
 
         recipes = load_recipes('data/recipes.csv')
         users = load_users('data/test_users.json')
 
         test_user = users[0]
-        print(f"Testing with user: {test_user.name}\n")
-
-        # Baseline
-        start = time.time()
-        baseline_plan = random_baseline_planner(recipes, test_user)
-        baseline_time = (time.time() - start) * 1000
-        print(f"Baseline: {'SUCCESS' if baseline_plan else 'FAILED'} ({baseline_time:.1f}ms)")
-
-        # Oracle (limited)
-        start = time.time()
-        oracle_plan = oracle_planner(recipes, test_user, max_combinations=5000)
-        oracle_time = (time.time() - start) * 1000
-        print(f"Oracle: {'SUCCESS' if oracle_plan else 'FAILED'} ({oracle_time:.1f}ms)")
-
-        # CSP
-        start = time.time()
-        csp_plan = greedy_csp_planner(recipes, test_user)
-        csp_time = (time.time() - start) * 1000
-        print(f"CSP: {'SUCCESS' if csp_plan else 'FAILED'} ({csp_time:.1f}ms)")
+        mode = 'sequential' if sequential else 'concurrent'
+        print(f"Testing with user: {test_user.name} ({mode})\n")
+
+        # The three planners are independent pure functions over the same
+        # inputs, so by default they run in parallel worker processes;
+        # --sequential keeps the in-process path for debugging
+        jobs = [
+            ('Baseline', random_baseline_planner, (recipes, test_user), {}),
+            ('Oracle', oracle_planner, (recipes, test_user), {}),
+            ('CSP', greedy_csp_planner, (recipes, test_user), {}),
+        ]
+
+        if sequential:
+            results = [_timed_planner(planner, *args, **kwargs)
+                       for _, planner, args, kwargs in jobs]
+        else:
+            import data_loader
+            initargs = (dict(data_loader.INGREDIENT_BITS),
+                        dict(data_loader.TAG_BITS),
+                        dict(data_loader.ALLERGEN_BITS))
+            with ProcessPoolExecutor(max_workers=len(jobs),
+                                     initializer=_init_algo_worker,
+                                     initargs=initargs) as executor:
+                futures = [executor.submit(_timed_planner, planner, *args, **kwargs)
+                           for _, planner, args, kwargs in jobs]
+                results = [future.result() for future in futures]
+
+        for (name, _, _, _), (plan, elapsed_ms) in zip(jobs, results):
+            print(f"{name}: {'SUCCESS' if plan else 'FAILED'} ({elapsed_ms:.1f}ms)")
 
         print("\n[OK]All algorithms executed successfully")
         return True
@@ -202,12 +235,14 @@ def main():
     print("# MEAL PLANNER SETUP VERIFICATION")
     print("#" * 60 + "\n")
 
+    sequential = '--sequential' in sys.argv
+
     tests = [
         test_data_loading,
         test_constraints,
         test_baseline,
         test_csp,
-        test_all_algorithms
+        lambda: test_all_algorithms(sequential=sequential)
     ]
 
     results = []
@@ -0,0 +1,18 @@
+"""
+WSGI entry point for production deployment.
+
+The development server (`python app.py`) handles one request at a time, so
+a single slow oracle request blocks every other user. Serve the app with
+gunicorn instead to handle planning requests concurrently:
+
+    gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+
+Planning is CPU-bound, so prefer the default sync workers with one worker
+per core (`-w $(nproc)`) over async workers like gevent.
+"""
+
+from app import app
+
+if __name__ == '__main__':
+    # Fallback for environments without gunicorn (no debug/reloader)
+    app.run(host='0.0.0.0', port=5000)